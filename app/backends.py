@@ -0,0 +1,160 @@
+# app/backends.py
+import json
+import mmap
+import os
+import struct
+import warnings
+
+import numpy as np
+import torch
+from transformers import RobertaConfig, RobertaForSequenceClassification
+
+_SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+class TorchBackend:
+    """
+    The fine-tuned model run in fp32 with PyTorch.
+    """
+    name = "torch"
+
+    def __init__(self, model_path):
+        self.model = RobertaForSequenceClassification.from_pretrained(model_path)
+        self.model.eval()
+
+    def logits(self, inputs):
+        """
+        Run a forward pass and return the classification logits.
+
+        :param inputs: Padded tensors produced by the tokenizer.
+        :return: A torch tensor of shape (batch, num_labels).
+        """
+        return self.model(**inputs).logits
+
+class QuantizedTorchBackend(TorchBackend):
+    """
+    The fine-tuned model with its linear layers dynamically quantized to int8.
+    """
+    name = "torch_int8"
+
+    def __init__(self, model_path):
+        super().__init__(model_path)
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_mmap_state_dict(path):
+    """
+    Map a safetensors file into memory read-only and expose its tensors without copying them.
+
+    Every process mapping the same file shares the same physical pages through the page cache.
+
+    :param path: Path of the .safetensors file.
+    :return: A dict of parameter name -> tensor backed by the mapping.
+    """
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    data_start = 8 + header_size
+    state_dict = {}
+    with warnings.catch_warnings():
+        # The tensors are never written to, so a read-only buffer is exactly what we want
+        warnings.filterwarnings("ignore", message="The given buffer is not writable")
+        for name, info in header.items():
+            if name == "__metadata__":
+                continue
+            dtype = _SAFETENSORS_DTYPES[info["dtype"]]
+            start, end = info["data_offsets"]
+            count = (end - start) // torch.tensor([], dtype=dtype).element_size()
+            if count == 0:
+                state_dict[name] = torch.empty(info["shape"], dtype=dtype)
+                continue
+            tensor = torch.frombuffer(mapping, dtype=dtype, count=count, offset=data_start + start)
+            state_dict[name] = tensor.reshape(info["shape"])
+    return state_dict
+
+class MmapTorchBackend(TorchBackend):
+    """
+    The fine-tuned model with its weights memory-mapped read-only from model.safetensors, so that
+    several worker processes serving the same model share one copy of the weights in memory.
+    """
+    name = "torch_mmap"
+
+    def __init__(self, model_path, weights_file="model.safetensors"):
+        weights_path = os.path.join(model_path, weights_file)
+        if not os.path.exists(weights_path):
+            raise FileNotFoundError(
+                f"{weights_path} not found. Convert the model first with: python model_training/export.py safetensors"
+            )
+        self.model = RobertaForSequenceClassification(RobertaConfig.from_pretrained(model_path))
+        expected = self.model.state_dict().keys()
+        state_dict = load_mmap_state_dict(weights_path)
+        missing = [key for key in expected if key not in state_dict]
+        if missing:
+            raise ValueError(f"{weights_path} is missing weights: {', '.join(missing)}")
+        # assign=True swaps the freshly initialized parameters for the mapped tensors instead of copying into them
+        self.model.load_state_dict({key: state_dict[key] for key in expected}, assign=True)
+        self.model.requires_grad_(False)
+        self.model.eval()
+
+class OnnxBackend:
+    """
+    The fine-tuned model exported to ONNX (see model_training/export.py) and run with ONNX Runtime.
+    """
+    name = "onnx"
+
+    def __init__(self, model_path, onnx_file="model.onnx", intra_op_threads=0):
+        import onnxruntime as ort
+
+        onnx_path = os.path.join(model_path, onnx_file)
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(
+                f"{onnx_path} not found. Export it first with: python model_training/export.py onnx"
+            )
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def logits(self, inputs):
+        """
+        Run the ONNX graph and return the classification logits.
+
+        :param inputs: Padded tensors produced by the tokenizer.
+        :return: A torch tensor of shape (batch, num_labels).
+        """
+        feed = {name: inputs[name].numpy().astype(np.int64) for name in self.input_names}
+        return torch.from_numpy(self.session.run(["logits"], feed)[0])
+
+BACKENDS = {
+    "torch": TorchBackend,
+    "torch_int8": QuantizedTorchBackend,
+    "torch_mmap": MmapTorchBackend,
+    "onnx": OnnxBackend,
+}
+
+def load_backend(name, model_path, intra_op_threads=0):
+    """
+    Instantiate the inference backend with the given name.
+
+    :param name: One of "torch", "torch_int8", "torch_mmap" or "onnx".
+    :param model_path: Directory of the fine-tuned model.
+    :param intra_op_threads: Intra-op thread count for ONNX Runtime (0 keeps its default).
+    :return: A backend object exposing logits(inputs).
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND '{name}'. Choose one of: {', '.join(BACKENDS)}")
+    if name == "onnx":
+        return OnnxBackend(model_path, intra_op_threads=intra_op_threads)
+    return BACKENDS[name](model_path)
@@ -0,0 +1,170 @@
+# app/batching.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from app import metrics
+
+_STOP = object()
+
+class MicroBatcher:
+    """
+    Groups concurrently submitted items into batches and runs each batch through a single call of
+    a batch function. A batch is dispatched as soon as it holds max_batch_size items or the oldest
+    item has waited max_wait_ms, whichever comes first.
+    """
+    def __init__(self, batch_fn, max_batch_size=32, max_wait_ms=5.0, name="classifier", executor=None,
+                 max_in_flight=1):
+        """
+        :param batch_fn: Callable taking a list of items and returning a list of results in the same order.
+        :param max_batch_size: Maximum number of items run in one call of batch_fn.
+        :param max_wait_ms: Maximum time in milliseconds the first item of a batch waits for more items.
+        :param name: Name used for the thread and the metrics group.
+        :param executor: Optional object with a submit(fn, *args) method returning a Future. When given,
+                         batches run on it and the next batch is collected while the previous one runs.
+        :param max_in_flight: Maximum number of batches running on the executor at once. While all slots
+                              are busy, newly arriving items keep joining the pending batch instead.
+        """
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+
+        group = f"batching.{name}"
+        self.queue_depth = metrics.register(group, "queue_depth", metrics.Gauge())
+        self.batch_size = metrics.register(
+            group, "batch_size", metrics.Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        )
+        self.queue_wait_ms = metrics.register(
+            group, "queue_wait_ms", metrics.Histogram([1, 2, 5, 10, 20, 50, 100, 250])
+        )
+        self.batches = metrics.register(group, "batches", metrics.Counter())
+        self.items = metrics.register(group, "items", metrics.Counter())
+
+    def start(self):
+        """
+        Start the background thread that collects and dispatches batches.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread once all queued items have been dispatched.
+        """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, item):
+        """
+        Queue a single item for batched processing.
+
+        :param item: The item to process.
+        :return: A concurrent.futures.Future that resolves to the result for this item.
+        """
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        self.queue_depth.set(self._queue.qsize())
+        return future
+
+    def _run(self):
+        """
+        Collect items from the queue into batches until stop() is called.
+        """
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            if self.executor is not None:
+                self._in_flight.acquire()
+                # Top up the batch with whatever arrived while waiting for a free slot
+                while not stopping and len(batch) < self.max_batch_size:
+                    try:
+                        entry = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if entry is _STOP:
+                        stopping = True
+                        break
+                    batch.append(entry)
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        """
+        Run one batch through batch_fn and resolve the futures of its items.
+
+        :param batch: List of (item, future, enqueue_time) tuples.
+        """
+        now = time.monotonic()
+        self.queue_depth.set(self._queue.qsize())
+        self.batch_size.observe(len(batch))
+        self.batches.inc()
+        self.items.inc(len(batch))
+
+        # Skip items whose caller has already given up on them
+        batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+        if not batch:
+            if self.executor is not None:
+                self._in_flight.release()
+            return
+        for _, _, enqueued_at in batch:
+            self.queue_wait_ms.observe((now - enqueued_at) * 1000.0)
+
+        items = [item for item, _, _ in batch]
+        if self.executor is None:
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                self._resolve(batch, error=e)
+            else:
+                self._resolve(batch, results=results)
+            return
+
+        def on_done(batch_future):
+            self._in_flight.release()
+            error = batch_future.exception()
+            if error is not None:
+                self._resolve(batch, error=error)
+            else:
+                self._resolve(batch, results=batch_future.result())
+
+        self.executor.submit(self.batch_fn, items).add_done_callback(on_done)
+
+    @staticmethod
+    def _resolve(batch, results=None, error=None):
+        """
+        Resolve the futures of a batch with either its results or an exception.
+
+        :param batch: List of (item, future, enqueue_time) tuples.
+        :param results: Results of batch_fn, in batch order.
+        :param error: Exception raised by batch_fn.
+        """
+        if error is not None:
+            for _, future, _ in batch:
+                future.set_exception(error)
+            return
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
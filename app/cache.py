@@ -0,0 +1,202 @@
+# app/cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from app import metrics
+
+# Rough per-entry bookkeeping cost (key, OrderedDict node, tuple) added to the payload size
+_ENTRY_OVERHEAD_BYTES = 200
+
+def normalize_review(text):
+    """
+    Normalize a review so that trivially different copies (unicode forms, whitespace) share a cache entry.
+    Case is preserved because the classifier is case-sensitive.
+
+    :param text: The raw review text.
+    :return: The normalized text.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+def cache_key(kind, review, *parts):
+    """
+    Build a content-addressed cache key.
+
+    :param kind: Kind of cached value (e.g. "prediction").
+    :param review: The review text; it is normalized before hashing.
+    :param parts: Further strings the value depends on, such as the model version or label.
+    :return: A hex digest identifying the value.
+    """
+    digest = hashlib.sha256()
+    for part in (kind, normalize_review(review), *parts):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def model_version(model_path, backend_name):
+    """
+    Derive a version string for the served model from its files and the inference backend.
+
+    :param model_path: Directory of the fine-tuned model.
+    :param backend_name: Name of the inference backend.
+    :return: A short hex string that changes whenever the model files or backend change.
+    """
+    digest = hashlib.sha256(backend_name.encode("utf-8"))
+    for name in sorted(os.listdir(model_path)):
+        stat = os.stat(os.path.join(model_path, name))
+        digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+class PredictionCache:
+    """
+    A JSON value cache with an in-memory LRU tier bounded by a memory budget and an optional
+    persistent SQLite tier. Entries in both tiers expire after a fixed time-to-live.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl_seconds=0, db_path=None, db_max_rows=0,
+                 db_purge_every=1000, name="predictions"):
+        """
+        :param max_bytes: Approximate memory budget of the in-memory tier.
+        :param ttl_seconds: Time after which entries expire (0 never expires them).
+        :param db_path: Path of the SQLite file for the persistent tier, or None to keep entries in memory only.
+        :param db_max_rows: Number of entries kept in the persistent tier; the oldest written are
+                            deleted first (0 leaves it unbounded).
+        :param db_purge_every: Number of writes between purges of expired and excess persistent entries.
+        :param name: Name of the metrics group.
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self.db_max_rows = db_max_rows
+        self.db_purge_every = max(db_purge_every, 1)
+        self._writes = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+            self._db_lock = threading.Lock()
+
+        group = f"cache.{name}"
+        self.memory_hits = metrics.register(group, "memory_hits", metrics.Counter())
+        self.disk_hits = metrics.register(group, "disk_hits", metrics.Counter())
+        self.misses = metrics.register(group, "misses", metrics.Counter())
+        self.evictions = metrics.register(group, "evictions", metrics.Counter())
+        self.disk_evictions = metrics.register(group, "disk_evictions", metrics.Counter())
+        self.memory_bytes = metrics.register(group, "memory_bytes", metrics.Gauge())
+        if self._db is not None:
+            self._purge_db()
+
+    @property
+    def persistent(self):
+        """
+        :return: True if the cache has a SQLite tier, whose lookups and writes block on disk I/O.
+        """
+        return self._db is not None
+
+    def get(self, key):
+        """
+        Look up a value, first in memory and then on disk.
+
+        :param key: Key built with cache_key().
+        :return: The cached value, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, size = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits.inc()
+                    return value
+                self._remove(key)
+
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and (row[1] is None or row[1] > now):
+                value = json.loads(row[0])
+                self._put_memory(key, value, row[1], len(row[0]))
+                self.disk_hits.inc()
+                return value
+
+        self.misses.inc()
+        return None
+
+    def set(self, key, value):
+        """
+        Store a JSON-serializable value in both tiers.
+
+        :param key: Key built with cache_key().
+        :param value: The value to cache.
+        """
+        expires_at = time.time() + self.ttl if self.ttl else None
+        encoded = json.dumps(value)
+        self._put_memory(key, value, expires_at, len(encoded))
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, encoded, expires_at)
+                )
+                self._db.commit()
+                self._writes += 1
+                purge = self._writes % self.db_purge_every == 0
+            if purge:
+                self._purge_db()
+
+    def close(self):
+        """
+        Close the persistent tier.
+        """
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+                self._db = None
+
+    def _purge_db(self):
+        """
+        Delete expired entries of the persistent tier, then the oldest written ones beyond db_max_rows.
+        """
+        with self._db_lock:
+            if self._db is None:
+                return
+            expired = self._db.execute(
+                "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+            ).rowcount
+            excess = 0
+            if self.db_max_rows:
+                # INSERT OR REPLACE gives every write a new, higher rowid, so rowid order is write order
+                excess = self._db.execute(
+                    "DELETE FROM cache WHERE rowid <= "
+                    "(SELECT rowid FROM cache ORDER BY rowid DESC LIMIT 1 OFFSET ?)",
+                    (self.db_max_rows,)
+                ).rowcount
+            self._db.commit()
+        self.disk_evictions.inc(expired + excess)
+
+    def _put_memory(self, key, value, expires_at, payload_size):
+        size = payload_size + len(key) + _ENTRY_OVERHEAD_BYTES
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions.inc()
+            self.memory_bytes.set(self._bytes)
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
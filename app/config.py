@@ -0,0 +1,91 @@
+# app/config.py
+import json
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Location of the fine-tuned classifier and tokenizer saved by model_training/train.py
+MODEL_PATH = os.getenv("MODEL_PATH", os.path.join(os.path.dirname(__file__), "../model/final_model"))
+
+# Set to 0 to run a classifier-only server that never loads the LLM explanation subsystem
+# (and therefore needs no OPENAI_API_KEY)
+EXPLANATIONS_ENABLED = os.getenv("EXPLANATIONS_ENABLED", "1") == "1"
+
+# Confidence-gated explanations: predictions with a confidence of at least EXPLAIN_SKIP_ABOVE get
+# no explanation, and those with at least EXPLAIN_DEFER_ABOVE are explained in the background and
+# fetched later from /explanations/{id}. Empty values disable the threshold. EXPLAIN_RULES overrides
+# the thresholds per label as JSON, e.g. {"Fake": {"skip_above": null}, "Genuine": {"defer_above": 0.9}}.
+EXPLAIN_DEFER_ABOVE = float(os.environ["EXPLAIN_DEFER_ABOVE"]) if os.getenv("EXPLAIN_DEFER_ABOVE") else None
+EXPLAIN_SKIP_ABOVE = float(os.environ["EXPLAIN_SKIP_ABOVE"]) if os.getenv("EXPLAIN_SKIP_ABOVE") else None
+EXPLAIN_RULES = json.loads(os.getenv("EXPLAIN_RULES") or "{}")
+
+# Background jobs: deferred explanations and POST /jobs/explanations are queued in the SQLite file
+# at JOBS_DB_PATH and run by JOB_WORKERS threads per server process. A failed job is retried up to
+# JOB_MAX_ATTEMPTS times, waiting JOB_RETRY_BACKOFF_SECONDS before the first retry and twice as
+# long before each further one. A job running for longer than JOB_LEASE_SECONDS is assumed lost
+# and run again; finished jobs are kept JOB_RETENTION_SECONDS for polling.
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "cache/jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "2"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+
+# Inference backend: "torch" (fp32), "torch_int8" (dynamically quantized), "torch_mmap" (fp32 with
+# weights memory-mapped from model.safetensors, shared between uvicorn workers) or "onnx" (ONNX
+# Runtime). The onnx and safetensors files are produced by model_training/export.py.
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+
+# Distilled student (model_training/distill.py): when STUDENT_MODEL_PATH is set, reviews are
+# classified by the student, and those it classifies with a confidence below ESCALATION_THRESHOLD
+# are classified again by the full model at MODEL_PATH. A threshold of 0 serves the student alone
+# and never loads the full model.
+STUDENT_MODEL_PATH = os.getenv("STUDENT_MODEL_PATH", "")
+ESCALATION_THRESHOLD = float(os.getenv("ESCALATION_THRESHOLD", "0.9"))
+
+# Micro-batching: single-review requests are grouped into one forward pass of up to
+# BATCH_MAX_SIZE reviews, waiting at most BATCH_MAX_WAIT_MS for the batch to fill up.
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+# Bulk classification (/predict_batch): reviews are run through the model BULK_BATCH_SIZE at a
+# time, and requests with more than BULK_STREAM_THRESHOLD reviews are answered as streamed NDJSON.
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "64"))
+BULK_STREAM_THRESHOLD = int(os.getenv("BULK_STREAM_THRESHOLD", "1000"))
+
+# Inference executor: forward passes run on INFERENCE_WORKERS dedicated threads. The torch
+# intra-op/inter-op thread counts are left at their defaults when set to 0.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+TORCH_INTRA_OP_THREADS = int(os.getenv("TORCH_INTRA_OP_THREADS", "0"))
+TORCH_INTER_OP_THREADS = int(os.getenv("TORCH_INTER_OP_THREADS", "0"))
+
+# Padding: reviews are truncated to MAX_SEQ_LENGTH tokens (matching model_training/preprocessing.py)
+# and each batch is padded to the smallest of PAD_BUCKETS that fits its longest review. An empty
+# PAD_BUCKETS pads each batch to exactly its longest review.
+MAX_SEQ_LENGTH = int(os.getenv("MAX_SEQ_LENGTH", "256"))
+PAD_BUCKETS = [int(b) for b in os.getenv("PAD_BUCKETS", "32,64,128,256").split(",") if b.strip()]
+
+# Token ids of the TOKEN_CACHE_SIZE most recently seen review texts are cached, so repeated
+# reviews skip tokenization (0 disables the cache)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# Prediction cache: results are keyed by a hash of the normalized review and the model version.
+# CACHE_MAX_MB bounds the in-memory LRU tier; setting CACHE_DB_PATH adds a persistent SQLite tier.
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+CACHE_MAX_MB = float(os.getenv("CACHE_MAX_MB", "64"))
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "86400"))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "")
+# The SQLite tier keeps at most CACHE_DB_MAX_ROWS entries (0 is unbounded); expired and excess
+# entries are deleted, oldest first, every CACHE_DB_PURGE_EVERY writes
+CACHE_DB_MAX_ROWS = int(os.getenv("CACHE_DB_MAX_ROWS", "1000000"))
+CACHE_DB_PURGE_EVERY = int(os.getenv("CACHE_DB_PURGE_EVERY", "1000"))
+
+# Streaming protocol 2: a checkpoint event with the full explanation so far is sent every
+# SSE_CHECKPOINT_EVERY token events (0 disables checkpoints)
+SSE_CHECKPOINT_EVERY = int(os.getenv("SSE_CHECKPOINT_EVERY", "100"))
+
+# Token coalescing: explanation tokens are buffered and sent as one event once SSE_FLUSH_BYTES
+# have accumulated or SSE_FLUSH_INTERVAL_MS after the first buffered token (both 0 disables it)
+SSE_FLUSH_INTERVAL_MS = float(os.getenv("SSE_FLUSH_INTERVAL_MS", "30"))
+SSE_FLUSH_BYTES = int(os.getenv("SSE_FLUSH_BYTES", "256"))
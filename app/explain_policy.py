@@ -0,0 +1,48 @@
+# app/explain_policy.py
+from app import metrics
+
+# Decisions of the explanation policy
+NOW = "now"
+DEFER = "defer"
+SKIP = "skip"
+
+class ExplanationPolicy:
+    """
+    Decides from the classifier's confidence whether a prediction is explained right away, explained
+    in the background, or not explained at all. High-confidence predictions rarely need the LLM's
+    reasoning, so gating them saves most LLM calls and their latency.
+    """
+    def __init__(self, defer_above=None, skip_above=None, label_rules=None):
+        """
+        :param defer_above: Predictions with at least this confidence are explained in the background (None disables).
+        :param skip_above: Predictions with at least this confidence are not explained (None disables).
+        :param label_rules: Optional dict of label -> dict with 'defer_above' and/or 'skip_above'
+                            overriding the thresholds for that label; a null value disables the threshold.
+        """
+        self.defer_above = defer_above
+        self.skip_above = skip_above
+        self.label_rules = label_rules or {}
+        self.decisions = {
+            decision: metrics.register("explain_policy", decision, metrics.Counter())
+            for decision in (NOW, DEFER, SKIP)
+        }
+
+    def decide(self, label, confidence):
+        """
+        Decide how to explain a prediction.
+
+        :param label: The predicted label.
+        :param confidence: The classifier's confidence in the label.
+        :return: NOW, DEFER or SKIP.
+        """
+        rule = self.label_rules.get(label, {})
+        skip_above = rule.get("skip_above", self.skip_above)
+        defer_above = rule.get("defer_above", self.defer_above)
+        if skip_above is not None and confidence >= skip_above:
+            decision = SKIP
+        elif defer_above is not None and confidence >= defer_above:
+            decision = DEFER
+        else:
+            decision = NOW
+        self.decisions[decision].inc()
+        return decision
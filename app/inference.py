@@ -0,0 +1,173 @@
+# app/inference.py
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from app import metrics
+
+class InferenceExecutor:
+    """
+    Runs model forward passes on a dedicated thread pool under torch.inference_mode(), so that
+    neither the event loop nor the web server's request threads are blocked by inference and no
+    autograd state is recorded.
+    """
+    def __init__(self, max_workers=1, intra_op_threads=0, inter_op_threads=0):
+        """
+        :param max_workers: Number of forward passes that may run concurrently.
+        :param intra_op_threads: Threads used inside a single operator (0 keeps the torch default).
+        :param inter_op_threads: Threads used to run independent operators (0 keeps the torch default).
+        """
+        if intra_op_threads:
+            torch.set_num_threads(intra_op_threads)
+        if inter_op_threads:
+            try:
+                torch.set_num_interop_threads(inter_op_threads)
+            except RuntimeError:
+                # Can only be set once, before any inter-op parallel work has started
+                print("Warning: inter-op thread count already fixed, ignoring TORCH_INTER_OP_THREADS")
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+
+        self.forward_ms = metrics.register(
+            "inference", "forward_ms", metrics.Histogram([5, 10, 20, 50, 100, 200, 500, 1000])
+        )
+        self.calls = metrics.register("inference", "calls", metrics.Counter())
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedule fn(*args, **kwargs) on the inference pool.
+
+        :param fn: Callable performing the forward pass.
+        :return: A concurrent.futures.Future for the return value of fn.
+        """
+        return self._pool.submit(self._run, fn, args, kwargs)
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the inference pool and wait for its result.
+
+        :param fn: Callable performing the forward pass.
+        :return: The return value of fn.
+        """
+        return self.submit(fn, *args, **kwargs).result()
+
+    def shutdown(self):
+        """
+        Wait for running forward passes to finish and release the pool threads.
+        """
+        self._pool.shutdown(wait=True)
+
+    def _run(self, fn, args, kwargs):
+        start = time.perf_counter()
+        with torch.inference_mode():
+            result = fn(*args, **kwargs)
+        self.forward_ms.observe((time.perf_counter() - start) * 1000.0)
+        self.calls.inc()
+        return result
+
+class LengthBucketer:
+    """
+    Tokenizes reviews, remembering the token ids of recently seen texts, and pads tokenized batches
+    to the smallest of a fixed set of lengths that fits the longest sequence. Keeps a forward-pass
+    latency histogram per padded length.
+    """
+    def __init__(self, tokenizer, max_length=256, buckets=(), cache_size=0):
+        """
+        :param tokenizer: Tokenizer used for encoding and padding.
+        :param max_length: Maximum sequence length; longer reviews are truncated.
+        :param buckets: Padded lengths to round up to. Empty pads to the longest sequence in the batch.
+        :param cache_size: Number of texts whose token ids are kept in an LRU cache (0 disables it).
+        """
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.buckets = sorted(b for b in buckets if b < max_length)
+        if buckets:
+            self.buckets.append(max_length)
+        self.cache_size = cache_size
+        self._token_ids = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Fast tokenizers raise "Already borrowed" when called from several threads at once
+        self._tokenizer_lock = threading.Lock()
+        self._latency = {}
+        self._lock = threading.Lock()
+
+        self.cache_hits = metrics.register("tokenization", "cache_hits", metrics.Counter())
+        self.cache_misses = metrics.register("tokenization", "cache_misses", metrics.Counter())
+
+    def encode(self, reviews):
+        """
+        Tokenize reviews without padding, in one batched call for the texts missing from the cache.
+
+        :param reviews: List of review strings.
+        :return: A dict of 'input_ids' and 'attention_mask' holding unpadded lists, one per review.
+        """
+        if not self.cache_size:
+            with self._tokenizer_lock:
+                encodings = self.tokenizer(reviews, truncation=True, max_length=self.max_length)
+            return {"input_ids": encodings["input_ids"], "attention_mask": encodings["attention_mask"]}
+
+        input_ids = [None] * len(reviews)
+        with self._cache_lock:
+            for index, review in enumerate(reviews):
+                ids = self._token_ids.get(review)
+                if ids is not None:
+                    self._token_ids.move_to_end(review)
+                    input_ids[index] = ids
+        missing = [index for index, ids in enumerate(input_ids) if ids is None]
+        self.cache_hits.inc(len(reviews) - len(missing))
+        self.cache_misses.inc(len(missing))
+
+        if missing:
+            texts = [reviews[index] for index in missing]
+            with self._tokenizer_lock:
+                encoded = self.tokenizer(texts, truncation=True, max_length=self.max_length)["input_ids"]
+            with self._cache_lock:
+                for index, text, ids in zip(missing, texts, encoded):
+                    input_ids[index] = ids
+                    self._token_ids[text] = ids
+                    self._token_ids.move_to_end(text)
+                while len(self._token_ids) > self.cache_size:
+                    self._token_ids.popitem(last=False)
+        return {"input_ids": input_ids, "attention_mask": [[1] * len(ids) for ids in input_ids]}
+
+    def pad(self, encodings):
+        """
+        Pad unpadded encodings to the bucket of their longest sequence.
+
+        :param encodings: Mapping of input names to lists of token id lists.
+        :return: A tuple of (padded tensors, padded length).
+        """
+        longest = max(len(ids) for ids in encodings["input_ids"])
+        length = self.bucket_for(longest)
+        inputs = self.tokenizer.pad(dict(encodings), padding="max_length", max_length=length, return_tensors="pt")
+        return inputs, length
+
+    def bucket_for(self, length):
+        """
+        Return the padded length used for a batch whose longest sequence has the given length.
+
+        :param length: Length of the longest sequence.
+        :return: The smallest bucket that fits, or the length itself when bucketing is disabled.
+        """
+        for bucket in self.buckets:
+            if length <= bucket:
+                return bucket
+        return length
+
+    def observe(self, length, elapsed_ms):
+        """
+        Record the forward-pass latency of a batch padded to the given length.
+
+        :param length: Padded sequence length of the batch.
+        :param elapsed_ms: Forward-pass time in milliseconds.
+        """
+        with self._lock:
+            histogram = self._latency.get(length)
+            if histogram is None:
+                histogram = metrics.register(
+                    "padding", f"forward_ms_len_{length}", metrics.Histogram([5, 10, 20, 50, 100, 200, 500, 1000])
+                )
+                self._latency[length] = histogram
+        histogram.observe(elapsed_ms)
@@ -0,0 +1,314 @@
+# app/jobs.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from app import metrics
+
+# Job priorities; lower values run first
+INTERACTIVE = 0
+BULK = 10
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class JobQueue:
+    """
+    A persistent job queue in SQLite with a pool of worker threads.
+
+    Jobs run in priority order, then oldest first. A failing job is retried with exponential backoff
+    until max_attempts, after which it is marked failed. A running job holds a lease; if its worker
+    dies (or the server restarts) the lease expires and the job is picked up again. Claims are made
+    in an immediate transaction, so several server processes can share the same database file.
+    """
+    def __init__(self, db_path, max_workers=2, max_attempts=3, retry_backoff_seconds=2.0, lease_seconds=300.0,
+                 retention_seconds=86400.0, poll_interval=0.5, name="jobs"):
+        """
+        :param db_path: Path of the SQLite file holding the queue.
+        :param max_workers: Number of jobs run concurrently by this process.
+        :param max_attempts: Number of times a job is tried before it is marked failed.
+        :param retry_backoff_seconds: Delay before the first retry; doubled for every further attempt.
+        :param lease_seconds: Time after which a running job is assumed lost and queued again.
+        :param retention_seconds: Time finished jobs are kept for polling before being deleted.
+        :param poll_interval: Seconds an idle worker waits before checking the database again.
+        :param name: Name of the worker threads and the metrics group.
+        """
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff_seconds
+        self.lease = lease_seconds
+        self.retention = retention_seconds
+        self.poll_interval = poll_interval
+        self.name = name
+        self._handlers = {}
+        self._threads = []
+        self._stopping = threading.Event()
+        self._wakeup = threading.Condition()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._db.row_factory = sqlite3.Row
+        self._db_lock = threading.Lock()
+        with self._db_lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    available_at REAL NOT NULL,
+                    lease_expires_at REAL
+                )
+                """
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created_at)")
+
+        group = name
+        self.enqueued = metrics.register(group, "enqueued", metrics.Counter())
+        self.completed = metrics.register(group, "completed", metrics.Counter())
+        self.failed = metrics.register(group, "failed", metrics.Counter())
+        self.retries = metrics.register(group, "retries", metrics.Counter())
+        self.worker_errors = metrics.register(group, "worker_errors", metrics.Counter())
+        self.lost_leases = metrics.register(group, "lost_leases", metrics.Counter())
+        self.queue_depth = metrics.register(group, "queue_depth", metrics.Gauge())
+        self.run_ms = metrics.register(
+            group, "run_ms", metrics.Histogram([100, 500, 1000, 2000, 5000, 10000, 30000, 60000])
+        )
+
+    def register(self, kind, handler):
+        """
+        Register the function that runs jobs of a given kind.
+
+        :param kind: Job kind, as passed to enqueue().
+        :param handler: Callable taking the job payload and returning a JSON-serializable result.
+        """
+        self._handlers[kind] = handler
+
+    def start(self):
+        """
+        Start the worker threads and delete finished jobs older than the retention period.
+        """
+        if self._threads:
+            return
+        with self._db_lock:
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (DONE, FAILED, time.time() - self.retention)
+            )
+        self._stopping.clear()
+        for i in range(self.max_workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        Stop the worker threads once their current jobs are finished. Queued jobs stay in the database.
+        """
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def close(self):
+        """
+        Stop the workers and close the database.
+        """
+        self.stop()
+        with self._db_lock:
+            self._db.close()
+
+    def enqueue(self, kind, payload, priority=INTERACTIVE, job_id=None):
+        """
+        Add a job to the queue.
+
+        :param kind: Job kind; a handler must be registered for it.
+        :param payload: JSON-serializable job input.
+        :param priority: INTERACTIVE, BULK or any other integer; lower values run first.
+        :param job_id: Optional id, making the job idempotent: if a job with this id is already
+                       queued, running or done, it is kept as is. A failed one is queued again.
+        :return: The job id.
+        """
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None or row["status"] == FAILED:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO jobs (id, kind, payload, priority, status, attempts, created_at, "
+                        "updated_at, available_at) VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?)",
+                        (job_id, kind, json.dumps(payload), priority, QUEUED, now, now, now)
+                    )
+                    self.enqueued.inc()
+                elif row["status"] == QUEUED:
+                    # A more urgent request for the same work raises its priority
+                    self._db.execute(
+                        "UPDATE jobs SET priority = MIN(priority, ?) WHERE id = ?", (priority, job_id)
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        """
+        Look up a job.
+
+        :param job_id: The job id.
+        :return: A dict with 'id', 'kind', 'status', 'priority', 'attempts', 'created_at', 'updated_at'
+                 and, once finished, 'result' or 'error'; None for an unknown job.
+        """
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT id, kind, status, priority, attempts, result, error, created_at, updated_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def _claim(self):
+        """
+        Atomically take the next runnable job: the most urgent queued job whose retry delay has
+        passed, or a running job whose lease has expired.
+
+        :return: A tuple of (id, kind, payload, attempts, lease expiry) or None when there is nothing to run.
+        """
+        now = time.time()
+        lease_expires_at = now + self.lease
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id, kind, payload, attempts FROM jobs "
+                    "WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_expires_at < ?) "
+                    "ORDER BY priority, created_at LIMIT 1",
+                    (QUEUED, now, RUNNING, now)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ?, lease_expires_at = ? "
+                        "WHERE id = ?",
+                        (RUNNING, now, lease_expires_at, row["id"])
+                    )
+                depth = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        self.queue_depth.set(depth)
+        if row is None:
+            return None
+        return row["id"], row["kind"], json.loads(row["payload"]), row["attempts"] + 1, lease_expires_at
+
+    def _finish(self, job_id, lease_expires_at, result=None, error=None, attempts=1):
+        """
+        Record the outcome of a job, queueing it again with backoff if it failed and has attempts left.
+
+        The job is only updated if it still holds the lease of this claim; if the lease expired and
+        another worker claimed the job again, that worker's outcome counts and this one is dropped.
+
+        :param job_id: The job id.
+        :param lease_expires_at: Lease expiry returned by _claim().
+        :param result: JSON-encoded result of a successful job.
+        :param error: Error message of a failed job.
+        :param attempts: Number of this attempt.
+        """
+        now = time.time()
+        claim = "WHERE id = ? AND status = ? AND lease_expires_at = ?"
+        with self._db_lock:
+            if error is None:
+                cursor = self._db.execute(
+                    "UPDATE jobs SET status = ?, result = ?, error = NULL, updated_at = ?, lease_expires_at = NULL "
+                    + claim,
+                    (DONE, result, now, job_id, RUNNING, lease_expires_at)
+                )
+            elif attempts < self.max_attempts:
+                cursor = self._db.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ?, available_at = ?, lease_expires_at = NULL "
+                    + claim,
+                    (QUEUED, error, now, now + self.retry_backoff * 2 ** (attempts - 1), job_id, RUNNING, lease_expires_at)
+                )
+            else:
+                cursor = self._db.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ?, lease_expires_at = NULL " + claim,
+                    (FAILED, error, now, job_id, RUNNING, lease_expires_at)
+                )
+        if cursor.rowcount == 0:
+            self.lost_leases.inc()
+            print(f"Warning: job {job_id} finished after its lease expired; discarding this attempt's outcome")
+            return
+        if error is None:
+            self.completed.inc()
+        elif attempts < self.max_attempts:
+            self.retries.inc()
+        else:
+            self.failed.inc()
+
+    def _work(self):
+        """
+        Claim and run jobs until stop() is called.
+        """
+        errors = 0
+        while not self._stopping.is_set():
+            try:
+                ran = self._run_next()
+                errors = 0
+            except Exception as e:
+                # Typically "database is locked" while other processes hold the queue file; the
+                # claimed job, if any, is run again once its lease expires
+                errors += 1
+                self.worker_errors.inc()
+                print(f"Warning: {threading.current_thread().name} failed: {type(e).__name__}: {e}")
+                ran = False
+                self._stopping.wait(min(self.poll_interval * 2 ** errors, 30.0))
+            if not ran and not self._stopping.is_set():
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+
+    def _run_next(self):
+        """
+        Claim and run one job.
+
+        :return: True if a job was run, False if there was nothing to run.
+        """
+        job = self._claim()
+        if job is None:
+            return False
+        job_id, kind, payload, attempts, lease_expires_at = job
+        start = time.perf_counter()
+        try:
+            handler = self._handlers.get(kind)
+            if handler is None:
+                raise ValueError(f"No handler registered for jobs of kind '{kind}'")
+            result = json.dumps(handler(payload))
+        except Exception as e:
+            self._finish(job_id, lease_expires_at, error=str(e) or type(e).__name__, attempts=attempts)
+        else:
+            self._finish(job_id, lease_expires_at, result=result, attempts=attempts)
+        self.run_ms.observe((time.perf_counter() - start) * 1000.0)
+        return True
@@ -1,10 +1,23 @@
-import os
 import torch
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from transformers import RobertaTokenizer, RobertaForSequenceClassification
-from explanation.enhanced_explain import generate_enhanced_explanation
+from typing import List
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ValidationError
+from transformers import RobertaTokenizerFast
+from app import config, metrics
+from app.backends import load_backend
+from app.batching import MicroBatcher
+from app.cache import PredictionCache, cache_key, model_version
+from app.explain_policy import DEFER, SKIP, ExplanationPolicy
+from app.inference import InferenceExecutor, LengthBucketer
+from app.jobs import BULK, DONE, FAILED, INTERACTIVE, JobQueue
+from app.startup import StartupTracker
+from app.streaming import explanation_events, job_events
 import json
+import time
+import asyncio
+from fastapi.responses import StreamingResponse
 
 app = FastAPI(
     title="Fake Product Review Detector API",
@@ -15,66 +28,602 @@ app = FastAPI(
 class ReviewRequest(BaseModel):
     review: str
 
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "../model/final_model")
-tokenizer = RobertaTokenizer.from_pretrained(MODEL_PATH)
-model = RobertaForSequenceClassification.from_pretrained(MODEL_PATH)
+class BatchReviewRequest(BaseModel):
+    reviews: List[str]
+    explain: bool = False
+
+MODEL_PATH = config.MODEL_PATH
+
+# Serving components, loaded in the background by the startup handler
+tokenizer = None
+backend = None  # the full model at MODEL_PATH, unless a student is served without escalation
+student = None  # the distilled student at config.STUDENT_MODEL_PATH, if configured
+bucketer = None
+MODEL_VERSION = None
+explainer = None  # the explanation.enhanced_explain module, unless explanations are disabled
+explanation_jobs = None  # the JobQueue generating explanations, created with the explainer
+startup = StartupTracker()
+
+# Memory usage of this worker process, so per-worker sharing of the model weights shows up on /stats
+metrics.register("process", "memory", metrics.ProcessMemory())
+
+student_predictions = metrics.register("distillation", "student_predictions", metrics.Counter())
+escalations = metrics.register("distillation", "escalations", metrics.Counter())
+
+def classify_batch(reviews):
+    """
+    Classify a batch of reviews with a single forward pass of the model.
+    
+    :param reviews: List of review strings.
+    :return: List of (label, confidence) tuples in the same order as the input.
+    """
+    return classify_encodings(bucketer.encode(reviews))
+
+def classify_encodings(encodings):
+    """
+    Pad already tokenized reviews to their length bucket and run one forward pass over them.
+    
+    When a distilled student is served, it runs first, and the reviews it is unsure about are
+    escalated to the full model.
+    
+    :param encodings: Unpadded token ids produced by the tokenizer.
+    :return: List of (label, confidence) tuples, one per review.
+    """
+    inputs, length = bucketer.pad(encodings)
+    start = time.perf_counter()
+    logits = (student if student is not None else backend).logits(inputs)
+    bucketer.observe(length, (time.perf_counter() - start) * 1000.0)
+    probabilities = torch.softmax(logits, dim=1)
+    if student is not None:
+        student_predictions.inc(len(probabilities))
+        if backend is not None:
+            probabilities = escalate_to_teacher(encodings, probabilities)
+    confidences, predictions = probabilities.max(dim=1)
+    return [
+        ("Fake" if prediction == 1 else "Genuine", confidence)
+        for prediction, confidence in zip(predictions.tolist(), confidences.tolist())
+    ]
+
+def escalate_to_teacher(encodings, probabilities):
+    """
+    Classify the reviews whose student confidence is below config.ESCALATION_THRESHOLD again with
+    the full model, in one forward pass padded to their own length bucket.
+    
+    :param encodings: Unpadded token ids of the batch.
+    :param probabilities: Class probabilities predicted by the student.
+    :return: The probabilities, with the rows of escalated reviews replaced by the full model's.
+    """
+    uncertain = (probabilities.max(dim=1).values < config.ESCALATION_THRESHOLD).nonzero().flatten().tolist()
+    if uncertain:
+        inputs, _ = bucketer.pad({key: [values[i] for i in uncertain] for key, values in encodings.items()})
+        probabilities[uncertain] = torch.softmax(backend.logits(inputs), dim=1)
+        escalations.inc(len(uncertain))
+    return probabilities
+
+executor = InferenceExecutor(
+    max_workers=config.INFERENCE_WORKERS,
+    intra_op_threads=config.TORCH_INTRA_OP_THREADS,
+    inter_op_threads=config.TORCH_INTER_OP_THREADS
+)
+
+batcher = MicroBatcher(
+    classify_batch,
+    max_batch_size=config.BATCH_MAX_SIZE,
+    max_wait_ms=config.BATCH_MAX_WAIT_MS,
+    executor=executor,
+    max_in_flight=config.INFERENCE_WORKERS
+)
+
+prediction_cache = PredictionCache(
+    max_bytes=int(config.CACHE_MAX_MB * 1024 * 1024),
+    ttl_seconds=config.CACHE_TTL_SECONDS,
+    db_path=config.CACHE_DB_PATH or None,
+    db_max_rows=config.CACHE_DB_MAX_ROWS,
+    db_purge_every=config.CACHE_DB_PURGE_EVERY
+) if config.CACHE_ENABLED else None
+
+def cache_get(kind, review, *parts):
+    """
+    Look up a cached value for a review, keyed by the served model version.
+    
+    :param kind: Kind of cached value (e.g. "prediction").
+    :param review: The review text.
+    :param parts: Further strings the value depends on.
+    :return: A tuple of (key, cached value or None).
+    """
+    if prediction_cache is None:
+        return None, None
+    key = cache_key(kind, review, MODEL_VERSION, *parts)
+    return key, prediction_cache.get(key)
+
+def cache_set(key, value):
+    """
+    Store a value under a key returned by cache_get().
+    
+    :param key: The cache key, or None when caching is disabled.
+    :param value: A JSON-serializable value.
+    """
+    if key is not None:
+        prediction_cache.set(key, value)
+
+def predict_review(review):
+    """
+    Classify a single review through the prediction cache and the micro-batcher.
+    
+    :param review: The review text.
+    :return: A tuple of (label, confidence).
+    """
+    key, cached = cache_get("prediction", review)
+    if cached is not None:
+        return tuple(cached)
+    result = batcher.submit(review).result()
+    cache_set(key, result)
+    return result
+
+async def apredict_review(review):
+    """
+    Async variant of predict_review() that awaits the micro-batcher without blocking the event loop.
+    
+    :param review: The review text.
+    :return: A tuple of (label, confidence).
+    """
+    # The SQLite tier is only touched from the threadpool, so the event loop never waits on disk
+    on_disk = prediction_cache is not None and prediction_cache.persistent
+    if on_disk:
+        key, cached = await run_in_threadpool(cache_get, "prediction", review)
+    else:
+        key, cached = cache_get("prediction", review)
+    if cached is not None:
+        return tuple(cached)
+    result = await asyncio.wrap_future(batcher.submit(review))
+    if on_disk:
+        await run_in_threadpool(cache_set, key, result)
+    else:
+        cache_set(key, result)
+    return result
+
+def explain_review(review, label):
+    """
+    Generate the summary and explanation for a classified review. Previously generated
+    explanations are served from the persistent explanation store.
+    
+    :param review: The review text.
+    :param label: The predicted label.
+    :return: A dict with keys 'summary' and 'explanation'.
+    """
+    explanation_result = explainer.generate_enhanced_explanation(review, label)
+    return {
+        "summary": explanation_result.get("summary", ""),
+        "explanation": explanation_result.get("explanation", "")
+    }
+
+explanation_policy = ExplanationPolicy(
+    defer_above=config.EXPLAIN_DEFER_ABOVE,
+    skip_above=config.EXPLAIN_SKIP_ABOVE,
+    label_rules=config.EXPLAIN_RULES
+)
+
+def enqueue_explanation(review, label, priority=INTERACTIVE):
+    """
+    Queue the explanation of a classified review as a background job. The job id is derived from
+    the review, the label and the prompt version, so the same explanation is only generated once
+    and a prompt change does not serve explanations generated with the old prompts.
+    
+    :param review: The review text.
+    :param label: The predicted label.
+    :param priority: INTERACTIVE or BULK; interactive jobs run first.
+    :return: The job id.
+    """
+    return explanation_jobs.enqueue(
+        "explanation", {"review": review, "label": label}, priority=priority,
+        job_id=cache_key("explanation", review, label, explainer.PROMPT_VERSION)
+    )
+
+def gated_explanation(review, label, confidence, priority=INTERACTIVE):
+    """
+    Explain a classified review now, in the background or not at all, as decided by the explanation policy.
+    
+    :param review: The review text.
+    :param label: The predicted label.
+    :param confidence: The classifier's confidence in the label.
+    :param priority: Job priority of a deferred explanation, INTERACTIVE or BULK.
+    :return: A dict with 'explanation_status' ("ready", "deferred" or "skipped"), 'summary' and
+             'explanation' (None unless ready), plus 'explanation_id' when deferred.
+    """
+    decision = explanation_policy.decide(label, confidence)
+    if decision == SKIP:
+        return {"explanation_status": "skipped", "summary": None, "explanation": None}
+    if decision == DEFER:
+        explanation_id = enqueue_explanation(review, label, priority)
+        return {
+            "explanation_status": "deferred",
+            "explanation_id": explanation_id,
+            "summary": None,
+            "explanation": None
+        }
+    return {"explanation_status": "ready", **explain_review(review, label)}
+
+def load_explainer():
+    """
+    Import the explanation subsystem, which builds the LLM clients and requires OPENAI_API_KEY,
+    and start the background job queue generating deferred explanations.
+    """
+    global explainer, explanation_jobs
+    from explanation import enhanced_explain
+    jobs = JobQueue(
+        config.JOBS_DB_PATH,
+        max_workers=config.JOB_WORKERS,
+        max_attempts=config.JOB_MAX_ATTEMPTS,
+        retry_backoff_seconds=config.JOB_RETRY_BACKOFF_SECONDS,
+        lease_seconds=config.JOB_LEASE_SECONDS,
+        retention_seconds=config.JOB_RETENTION_SECONDS
+    )
+    jobs.register("explanation", lambda payload: explain_review(payload["review"], payload["label"]))
+    jobs.start()
+    # The queue is published first, as explanation requests are accepted once explainer is set
+    explanation_jobs = jobs
+    explainer = enhanced_explain
+
+def on_components_loaded(loaded):
+    """
+    Wire up the classifier components loaded at startup.
+    
+    :param loaded: Dict of component name -> loaded value.
+    """
+    global tokenizer, backend, student, bucketer, MODEL_VERSION
+    tokenizer = loaded["tokenizer"]
+    backend = loaded.get("model")
+    student = loaded.get("student")
+    bucketer = LengthBucketer(
+        tokenizer, max_length=config.MAX_SEQ_LENGTH, buckets=config.PAD_BUCKETS, cache_size=config.TOKEN_CACHE_SIZE
+    )
+    versions = []
+    if backend is not None:
+        versions.append(model_version(MODEL_PATH, backend.name))
+    if student is not None:
+        versions.append(model_version(config.STUDENT_MODEL_PATH, student.name))
+        if backend is not None:
+            versions.append(f"escalate<{config.ESCALATION_THRESHOLD:g}")
+    MODEL_VERSION = "+".join(versions)
+    if student is None:
+        print(f"Inference backend: {backend.name}")
+    elif backend is None:
+        print(f"Inference backend: {student.name} (student only)")
+    else:
+        print(f"Inference backend: {student.name} (student, escalating below {config.ESCALATION_THRESHOLD:g})")
+
+@app.on_event("startup")
+def start_serving():
+    """
+    Start loading the tokenizer, the model (and the distilled student, when configured) and, when
+    enabled, the explanation subsystem in parallel.
+    The server accepts connections immediately; /ready reports when the classifier can serve.
+    """
+    student_only = config.STUDENT_MODEL_PATH and config.ESCALATION_THRESHOLD <= 0
+    required = {
+        "tokenizer": lambda: RobertaTokenizerFast.from_pretrained(config.STUDENT_MODEL_PATH or MODEL_PATH)
+    }
+    if not student_only:
+        required["model"] = lambda: load_backend(
+            config.INFERENCE_BACKEND, MODEL_PATH, intra_op_threads=config.TORCH_INTRA_OP_THREADS
+        )
+    if config.STUDENT_MODEL_PATH:
+        required["student"] = lambda: load_backend(
+            config.INFERENCE_BACKEND, config.STUDENT_MODEL_PATH, intra_op_threads=config.TORCH_INTRA_OP_THREADS
+        )
+    optional = {}
+    if config.EXPLANATIONS_ENABLED:
+        optional["explanation"] = load_explainer
+    else:
+        startup.disable("explanation")
+    startup.start(required, optional, on_loaded=on_components_loaded)
+    batcher.start()
+
+@app.on_event("shutdown")
+def stop_batcher():
+    batcher.stop()
+    executor.shutdown()
+    if explanation_jobs is not None:
+        explanation_jobs.close()
+    if prediction_cache is not None:
+        prediction_cache.close()
+
+def require_classifier():
+    """
+    Reject the request while the classifier is still loading.
+    """
+    if not startup.ready:
+        raise HTTPException(status_code=503, detail="The model is still loading")
+
+def require_explainer():
+    """
+    Reject the request if the explanation subsystem is disabled or failed to load.
+    """
+    require_classifier()
+    if explainer is None:
+        raise HTTPException(status_code=503, detail=explainer_unavailable_reason())
+
+def require_jobs():
+    """
+    Reject the request if the background job queue does not exist, because explanations are
+    disabled, failed to load or are still loading.
+    """
+    if explanation_jobs is None:
+        raise HTTPException(status_code=503, detail=explainer_unavailable_reason())
+
+def explainer_unavailable_reason():
+    """
+    :return: Why the explanation subsystem cannot serve, for 503 responses.
+    """
+    status = startup.status("explanation")
+    if status == "disabled":
+        return "Explanations are disabled on this server"
+    if status == "failed":
+        return f"The explanation subsystem failed to load: {startup.error('explanation')}"
+    return "The explanation subsystem is still loading"
+
+@app.get("/ready", summary="Readiness probe")
+def ready():
+    """
+    Report whether the classifier is loaded, with the status and load time of each component.
+    
+    :return: 200 once ready, 503 while loading or after a failed startup.
+    """
+    return JSONResponse(status_code=200 if startup.ready else 503, content=startup.snapshot())
+
+@app.get("/stats", summary="Runtime metrics")
+def stats():
+    """
+    Return queue depth, batch size, cache hit/miss counters, the memory usage of the answering
+    worker process and other runtime metrics.
+    
+    :return: JSON object of metric groups.
+    """
+    return metrics.snapshot()
+
+def iter_bulk_predictions(reviews, explain=False):
+    """
+    Classify a list of reviews in fixed-size batches, yielding results in input order.
+    
+    Cached reviews are answered without running the model. The remaining reviews are tokenized
+    in one call without padding, and each batch is then padded only to the length bucket of the
+    longest review it contains.
+    
+    :param reviews: List of review strings.
+    :param explain: Whether to also explain every review, subject to the explanation policy.
+    :return: A generator of dicts with keys 'index', 'label' and 'confidence' (plus the keys
+             returned by gated_explanation() when explain is set).
+    """
+    lookups = [cache_get("prediction", review) for review in reviews]
+    keys = [key for key, _ in lookups]
+    predictions = [prediction for _, prediction in lookups]
+    missing = [index for index, prediction in enumerate(predictions) if prediction is None]
+    encodings = bucketer.encode([reviews[index] for index in missing]) if missing else {}
+    
+    next_index = 0
+    for start in range(0, max(len(missing), 1), config.BULK_BATCH_SIZE):
+        indices = missing[start:start + config.BULK_BATCH_SIZE]
+        if indices:
+            chunk = {key: values[start:start + config.BULK_BATCH_SIZE] for key, values in encodings.items()}
+            for index, prediction in zip(indices, executor.run(classify_encodings, chunk)):
+                predictions[index] = prediction
+                cache_set(keys[index], prediction)
+        # Emit every result that is now available, keeping input order
+        while next_index < len(reviews) and predictions[next_index] is not None:
+            label, confidence = predictions[next_index]
+            result = {"index": next_index, "label": label, "confidence": confidence}
+            if explain:
+                result.update(gated_explanation(reviews[next_index], label, confidence, priority=BULK))
+            yield result
+            next_index += 1
+
+def parse_batch_body(body, ndjson):
+    """
+    Parse the body of a /predict_batch request.
+    
+    :param body: Raw request body.
+    :param ndjson: Whether the body is NDJSON rather than a JSON object.
+    :return: A tuple of (reviews, explain flag of the body).
+    """
+    if ndjson:
+        return parse_ndjson_reviews(body), False
+    batch_req = BatchReviewRequest.model_validate_json(body)
+    return batch_req.reviews, batch_req.explain
+
+def parse_ndjson_reviews(body):
+    """
+    Parse an NDJSON request body where each line is either a JSON string or an object with a 'review' field.
+    
+    :param body: Raw request body.
+    :return: List of review strings.
+    """
+    reviews = []
+    for line_no, line in enumerate(body.decode("utf-8").splitlines(), start=1):
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if isinstance(item, dict):
+            item = item.get("review")
+        if not isinstance(item, str):
+            raise ValueError(f"Line {line_no}: expected a string or an object with a 'review' string")
+        reviews.append(item)
+    return reviews
+
+@app.post("/predict_batch", summary="Classify many reviews at once")
+async def predict_batch(request: Request, explain: bool = False):
+    """
+    Classify a list of reviews without generating explanations, unless explicitly requested.
+    
+    The body is either JSON of the form {"reviews": [...], "explain": false} or NDJSON with one
+    review per line (Content-Type: application/x-ndjson). Large requests, and clients that send
+    Accept: application/x-ndjson, receive one JSON result per line in input order as soon as each
+    batch is classified.
+    
+    :param request: The incoming request.
+    :param explain: Query flag to also generate explanations (NDJSON bodies only).
+    :return: JSON with a 'results' list, or a streaming NDJSON response. A streamed response that
+             fails part-way ends with an {"error": ...} line.
+    """
+    body = await request.body()
+    try:
+        # Parsing a large body takes long enough to stall the event loop
+        reviews, body_explain = await run_in_threadpool(
+            parse_batch_body, body, "ndjson" in request.headers.get("content-type", "")
+        )
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    explain = explain or body_explain
+    if explain:
+        require_explainer()
+    else:
+        require_classifier()
+
+    stream = (
+        len(reviews) > config.BULK_STREAM_THRESHOLD
+        or "application/x-ndjson" in request.headers.get("accept", "")
+    )
+    if stream:
+        def ndjson_lines():
+            try:
+                for result in iter_bulk_predictions(reviews, explain):
+                    yield json.dumps(result) + "\n"
+            except Exception as e:
+                # The response has already started, so the failure is reported as a final line
+                # that tells a truncated result from a complete one
+                yield json.dumps({"error": str(e)}) + "\n"
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+    try:
+        results = await run_in_threadpool(lambda: list(iter_bulk_predictions(reviews, explain)))
+        return {"results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/predict_with_explanation", summary="Predict review authenticity with explanation")
 def predict_with_explanation(review_req: ReviewRequest):
     """
     Predict the authenticity of a review and generate an explanation.
     
+    Depending on the explanation policy and the classifier's confidence, the explanation is
+    returned right away, generated in the background for GET /explanations/{explanation_id},
+    or skipped; 'explanation_status' tells which.
+    
     :param review_req: Request body containing a 'review' string.
-    :return: JSON response with predicted label, summary, and explanation of the review.
+    :return: JSON response with predicted label, confidence, summary, and explanation of the review.
     """
+    require_explainer()
     try:
-        inputs = tokenizer(review_req.review, return_tensors="pt", truncation=True, padding="max_length", max_length=128)
-        outputs = model(**inputs)
-        prediction = torch.argmax(outputs.logits, dim=1).item()
-        print(f"Prediction: {prediction}")
-        label = "Fake" if prediction == 1 else "Genuine"
+        label, confidence = predict_review(review_req.review)
+        print(f"Prediction: {label}")
         
-        explanation_result = generate_enhanced_explanation(review_req.review, label)
         return {
             "label": label,
-            "summary": explanation_result.get("summary", ""),
-            "explanation": explanation_result.get("explanation", "")
+            "confidence": confidence,
+            **gated_explanation(review_req.review, label, confidence)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-import asyncio
-from fastapi.responses import StreamingResponse
-from explanation.enhanced_explain import generate_explanation_stream
+@app.get("/explanations/{explanation_id}", summary="Fetch a deferred explanation")
+def get_explanation(explanation_id: str):
+    """
+    Return an explanation deferred by the explanation policy.
+    
+    :param explanation_id: The 'explanation_id' returned with the prediction.
+    :return: 200 with the summary and explanation once ready, 202 while pending, 500 if generation failed,
+             503 when explanations are disabled or not loaded yet.
+    """
+    require_jobs()
+    job = explanation_jobs.get(explanation_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired explanation id")
+    if job["status"] == DONE:
+        return {"explanation_id": explanation_id, "status": "ready", **job["result"]}
+    if job["status"] == FAILED:
+        return JSONResponse(
+            status_code=500, content={"explanation_id": explanation_id, "status": "failed", "error": job["error"]}
+        )
+    return JSONResponse(status_code=202, content={"explanation_id": explanation_id, "status": "pending"})
+
+@app.post("/jobs/explanations", status_code=202, summary="Queue a prediction explanation as a background job")
+def create_explanation_job(review_req: ReviewRequest, priority: str = "interactive"):
+    """
+    Classify a review and queue its explanation as a background job, regardless of the explanation policy.
+    
+    Poll the job with GET /jobs/{job_id} or subscribe to its events with GET /jobs/{job_id}/events.
+    
+    :param review_req: Request body containing a 'review' string.
+    :param priority: "interactive" or "bulk"; interactive jobs are run first.
+    :return: 202 with the job id, the predicted label and the confidence.
+    """
+    priorities = {"interactive": INTERACTIVE, "bulk": BULK}
+    if priority not in priorities:
+        raise HTTPException(status_code=422, detail="priority must be 'interactive' or 'bulk'")
+    require_explainer()
+    try:
+        label, confidence = predict_review(review_req.review)
+        job_id = enqueue_explanation(review_req.review, label, priorities[priority])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"job_id": job_id, "label": label, "confidence": confidence}
+
+@app.get("/jobs/{job_id}", summary="Fetch the status and result of a background job")
+def get_job(job_id: str):
+    """
+    Return a background job.
+    
+    :param job_id: The 'job_id' returned when the job was queued.
+    :return: The job's status ("queued", "running", "done" or "failed"), attempts, and its result or error.
+    """
+    require_jobs()
+    job = explanation_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job id")
+    return job
+
+@app.get("/jobs/{job_id}/events", summary="Subscribe to the progress of a background job")
+async def get_job_events(job_id: str):
+    """
+    Stream a background job's status changes as server-sent events, ending with its result or error.
+    
+    :param job_id: The 'job_id' returned when the job was queued.
+    :return: A streaming response of 'status', 'result' or 'error', and 'end' events.
+    """
+    require_jobs()
+    if await run_in_threadpool(explanation_jobs.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job id")
+    events = job_events(lambda key: run_in_threadpool(explanation_jobs.get, key), job_id)
+    return StreamingResponse(events, media_type="text/event-stream")
 
 @app.post("/predict_with_explanation_stream", summary="Predict review authenticity with streaming explanation")
-async def predict_with_explanation_stream(review_req: ReviewRequest):
+async def predict_with_explanation_stream(review_req: ReviewRequest, protocol: int = 1):
     """
     Predict the authenticity of a review and stream the explanation tokens as they are generated.
     
+    The label and confidence are sent in a 'prediction' event as soon as the classifier has run,
+    before the LLM is called. With protocol=2 a 'summary' event follows, then token events carrying
+    only the new text and its sequence number, and a 'checkpoint' event with the full explanation so
+    far every SSE_CHECKPOINT_EVERY token events so clients can resync. With protocol=1 the legacy
+    'header' event follows instead, and every token event also carries the full explanation so far.
+    Tokens are coalesced into one event per SSE_FLUSH_BYTES or SSE_FLUSH_INTERVAL_MS, whichever comes first.
+    
     :param review_req: Request body containing a 'review' string.
+    :param protocol: Version of the event payload format (1 or 2).
     :return: A streaming response of JSON objects, each containing partial explanation tokens.
     """
+    if protocol not in (1, 2):
+        raise HTTPException(status_code=422, detail="protocol must be 1 or 2")
+    require_explainer()
     try:
-        inputs = tokenizer(review_req.review, return_tensors="pt", truncation=True, padding="max_length", max_length=128)
-        outputs = model(**inputs)
-        prediction = torch.argmax(outputs.logits, dim=1).item()
-        label = "Fake" if prediction == 1 else "Genuine"
-        confidence = torch.softmax(outputs.logits, dim=1).max().item()
-        
-        summary, token_iter = generate_explanation_stream(review_req.review, label)
-        
-        async def event_generator():
-            header = {"type": "header", "label": label, "summary": summary, "confidence": confidence}
-            yield f"data: {json.dumps(header)}\n\n"
-            explanation_text = ""
-            for token in token_iter:
-                explanation_text += token
-                payload = {"type": "token", "token": token, "explanation": explanation_text}
-                yield f"data: {json.dumps(payload)}\n\n"
-                await asyncio.sleep(0)  # yield control
-            yield f"data: {json.dumps({'type': 'end'})}\n\n"
-        
-        return StreamingResponse(event_generator(), media_type="text/event-stream")
+        label, confidence = await apredict_review(review_req.review)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    events = explanation_events(
+        {"label": label, "confidence": confidence},
+        lambda: explainer.agenerate_explanation_stream(review_req.review, label),
+        protocol=protocol,
+        checkpoint_every=config.SSE_CHECKPOINT_EVERY,
+        flush_interval_ms=config.SSE_FLUSH_INTERVAL_MS,
+        flush_bytes=config.SSE_FLUSH_BYTES
+    )
+    return StreamingResponse(events, media_type="text/event-stream")
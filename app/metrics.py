@@ -0,0 +1,165 @@
+# app/metrics.py
+import bisect
+import os
+import threading
+
+class Counter:
+    """
+    A thread-safe monotonically increasing counter.
+    """
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """
+        Increase the counter.
+
+        :param amount: Value to add. Defaults to 1.
+        """
+        with self._lock:
+            self._value += amount
+
+    def snapshot(self):
+        """
+        Return the current counter value.
+
+        :return: The counter value.
+        """
+        return self._value
+
+class Gauge:
+    """
+    A thread-safe value that can go up and down, remembering the maximum it has reached.
+    """
+    def __init__(self):
+        self._value = 0
+        self._max = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        """
+        Set the gauge to a new value.
+
+        :param value: The new value.
+        """
+        with self._lock:
+            self._value = value
+            self._max = max(self._max, value)
+
+    def snapshot(self):
+        """
+        Return the current and maximum value of the gauge.
+
+        :return: A dict with keys 'value' and 'max'.
+        """
+        return {"value": self._value, "max": self._max}
+
+class Histogram:
+    """
+    A thread-safe histogram with fixed upper bucket bounds.
+    """
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """
+        Record a single observation.
+
+        :param value: The observed value.
+        """
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._count += 1
+            self._sum += value
+
+    def snapshot(self):
+        """
+        Return the bucket counts together with the total count and mean.
+
+        :return: A dict with keys 'count', 'mean' and 'buckets' (upper bound -> count).
+        """
+        with self._lock:
+            counts = list(self._counts)
+            count = self._count
+            total = self._sum
+        buckets = {f"le_{bound:g}": n for bound, n in zip(self.buckets, counts)}
+        buckets["le_inf"] = counts[-1]
+        return {
+            "count": count,
+            "mean": total / count if count else 0.0,
+            "buckets": buckets
+        }
+
+class ProcessMemory:
+    """
+    Memory usage of the current process, read from /proc/self/smaps_rollup (Linux only).
+
+    With several server workers, RSS counts shared pages (such as memory-mapped model weights) in
+    every worker, while PSS divides them among the processes sharing them; summing PSS over the
+    workers gives their real combined footprint.
+    """
+    _FIELDS = {
+        "Rss": "rss_mb",
+        "Pss": "pss_mb",
+        "Shared_Clean": "shared_clean_mb",
+        "Shared_Dirty": "shared_dirty_mb",
+        "Private_Clean": "private_clean_mb",
+        "Private_Dirty": "private_dirty_mb"
+    }
+
+    def __init__(self, path="/proc/self/smaps_rollup"):
+        self.path = path
+
+    def snapshot(self):
+        """
+        Return the memory usage of the process in MB.
+
+        :return: A dict with the process id and the RSS, PSS, shared and private memory in MB,
+                 or only the process id where smaps_rollup is unavailable.
+        """
+        report = {"pid": os.getpid()}
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    field, _, value = line.partition(":")
+                    if field in self._FIELDS:
+                        report[self._FIELDS[field]] = round(int(value.split()[0]) / 1024.0, 1)
+        except OSError:
+            pass
+        return report
+
+# Registry of every metric exported on the /stats endpoint, grouped by subsystem
+_registry = {}
+_registry_lock = threading.Lock()
+
+def register(group, name, metric):
+    """
+    Register a metric so that it is included in snapshot().
+
+    :param group: Name of the subsystem the metric belongs to (e.g. "batching").
+    :param name: Name of the metric within its group.
+    :param metric: A Counter, Gauge, Histogram or any other object with a snapshot() method.
+    :return: The registered metric, for convenient assignment.
+    """
+    with _registry_lock:
+        _registry.setdefault(group, {})[name] = metric
+    return metric
+
+def snapshot():
+    """
+    Take a snapshot of every registered metric.
+
+    :return: A nested dict of group -> metric name -> metric snapshot.
+    """
+    with _registry_lock:
+        groups = {group: dict(metrics) for group, metrics in _registry.items()}
+    return {
+        group: {name: metric.snapshot() for name, metric in metrics.items()}
+        for group, metrics in groups.items()
+    }
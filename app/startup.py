@@ -0,0 +1,125 @@
+# app/startup.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class StartupTracker:
+    """
+    Loads serving components in parallel on a background thread, recording the status and load
+    time of each component for the readiness probe.
+
+    Required components must all load for the service to become ready. Optional components may
+    fail without blocking readiness; their error is reported instead.
+    """
+    def __init__(self):
+        self.components = {}
+        self.total_seconds = None
+        self._ready = threading.Event()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def ready(self):
+        """
+        :return: True once every required component has loaded.
+        """
+        return self._ready.is_set()
+
+    def disable(self, name):
+        """
+        Record a component that is switched off by configuration.
+
+        :param name: Component name.
+        """
+        with self._lock:
+            self.components[name] = {"status": "disabled"}
+
+    def status(self, name):
+        """
+        :param name: Component name.
+        :return: The component's status ("pending", "ready", "failed" or "disabled"), or None if unknown.
+        """
+        with self._lock:
+            return self.components.get(name, {}).get("status")
+
+    def error(self, name):
+        """
+        :param name: Component name.
+        :return: The error message of a failed component, or None.
+        """
+        with self._lock:
+            return self.components.get(name, {}).get("error")
+
+    def start(self, required, optional=None, on_loaded=None):
+        """
+        Start loading components in the background.
+
+        :param required: Dict of component name -> zero-argument loader.
+        :param optional: Dict of component name -> zero-argument loader whose failure does not block
+                         readiness. Readiness does not wait for them either, so their loaders should
+                         publish the loaded value themselves.
+        :param on_loaded: Called with a dict of name -> loaded value once all required components
+                          have loaded, before the service is marked ready. It is timed as the
+                          "setup" component.
+        """
+        self._thread = threading.Thread(
+            target=self._load, args=(required, optional or {}, on_loaded), name="startup", daemon=True
+        )
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """
+        Block until loading has finished, successfully or not.
+
+        :param timeout: Maximum time to wait in seconds.
+        :return: True if the service is ready.
+        """
+        self._done.wait(timeout)
+        return self.ready
+
+    def snapshot(self):
+        """
+        :return: A dict with the overall readiness, total startup time and per-component status.
+        """
+        with self._lock:
+            components = {name: dict(info) for name, info in self.components.items()}
+        return {"ready": self.ready, "startup_seconds": self.total_seconds, "components": components}
+
+    def _load(self, required, optional, on_loaded):
+        started = time.perf_counter()
+        loaders = {**required, **optional}
+        with self._lock:
+            for name in loaders:
+                self.components[name] = {"status": "pending"}
+        pool = ThreadPoolExecutor(max_workers=len(loaders) or 1, thread_name_prefix="startup")
+        futures = {name: pool.submit(self._timed, name, loader) for name, loader in loaders.items()}
+        # Become ready as soon as the required components are in, without waiting for optional ones
+        results = {name: futures[name].result() for name in required}
+        if all(self.status(name) == "ready" for name in required):
+            if on_loaded is not None:
+                self._timed("setup", lambda: on_loaded(results))
+            if on_loaded is None or self.status("setup") == "ready":
+                self._ready.set()
+        pool.shutdown(wait=True)
+        self.total_seconds = round(time.perf_counter() - started, 3)
+        self._done.set()
+        print(f"Startup finished in {self.total_seconds:.2f}s (ready: {self.ready})")
+        for name, info in self.snapshot()["components"].items():
+            print(f"  {name}: {info['status']}" + (f" in {info['seconds']:.2f}s" if "seconds" in info else ""))
+
+    def _timed(self, name, loader):
+        started = time.perf_counter()
+        try:
+            value = loader()
+        except Exception as e:
+            with self._lock:
+                self.components[name] = {
+                    "status": "failed",
+                    "seconds": round(time.perf_counter() - started, 3),
+                    "error": str(e)
+                }
+            return None
+        with self._lock:
+            self.components[name] = {"status": "ready", "seconds": round(time.perf_counter() - started, 3)}
+        return value
@@ -0,0 +1,165 @@
+# app/streaming.py
+import asyncio
+import json
+
+from app.jobs import DONE, FAILED
+
+_DONE = object()
+_FLUSH = object()
+
+class _Failure:
+    """
+    Wraps an exception raised by the token source so it can be re-raised by the consumer.
+    """
+    def __init__(self, error):
+        self.error = error
+
+def format_sse(payload):
+    """
+    Encode a payload as a server-sent event.
+
+    :param payload: JSON-serializable event payload.
+    :return: The SSE-formatted string.
+    """
+    return f"data: {json.dumps(payload)}\n\n"
+
+async def coalesce_tokens(tokens, flush_interval_ms=30.0, flush_bytes=256):
+    """
+    Group tokens from an async iterator into larger chunks. Buffered tokens are flushed when they
+    reach flush_bytes, or flush_interval_ms after the first of them arrived, whichever comes first.
+
+    :param tokens: Async iterator of string tokens.
+    :param flush_interval_ms: Maximum time a token is held back (0 disables time-based flushing).
+    :param flush_bytes: Buffer size in UTF-8 bytes that triggers a flush (0 or 1 flushes every token).
+    :return: An async generator of chunks that concatenate to the original tokens. If the source
+             raises, the buffered tokens are yielded before the exception propagates.
+    """
+    if flush_interval_ms <= 0 and flush_bytes <= 1:
+        async for token in tokens:
+            yield token
+        return
+
+    # The source is pumped into a queue so that a flush timer can wake the consumer by putting a
+    # marker into the same queue, without a per-token timeout
+    queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for token in tokens:
+                queue.put_nowait(token)
+            queue.put_nowait(_DONE)
+        except Exception as e:
+            queue.put_nowait(_Failure(e))
+
+    loop = asyncio.get_running_loop()
+    pump_task = asyncio.ensure_future(pump())
+    buffer, size, timer = [], 0, None
+    try:
+        while True:
+            item = await queue.get()
+            if item is _FLUSH:
+                if timer is not None and buffer:
+                    yield "".join(buffer)
+                    buffer, size = [], 0
+                timer = None
+                continue
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                # Tokens generated before the failure are still delivered
+                if buffer:
+                    yield "".join(buffer)
+                    buffer, size = [], 0
+                raise item.error
+            buffer.append(item)
+            size += len(item.encode("utf-8"))
+            if flush_bytes > 1 and size >= flush_bytes:
+                if timer is not None:
+                    timer.cancel()
+                    timer = None
+                yield "".join(buffer)
+                buffer, size = [], 0
+            elif timer is None and flush_interval_ms > 0:
+                timer = loop.call_later(flush_interval_ms / 1000.0, queue.put_nowait, _FLUSH)
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if timer is not None:
+            timer.cancel()
+        pump_task.cancel()
+
+async def explanation_events(prediction, explain, protocol=1, checkpoint_every=0, flush_interval_ms=0.0,
+                             flush_bytes=0):
+    """
+    Produce the server-sent events of a streamed prediction and explanation.
+
+    A 'prediction' event with the label and confidence is sent immediately, before the explanation
+    is requested. It is followed by a 'summary' event (protocol 2) or the legacy 'header' event
+    repeating the prediction together with the summary (protocol 1), and then the explanation tokens.
+
+    :param prediction: Dict with keys 'label' and 'confidence'.
+    :param explain: Coroutine function returning a tuple of the summary and an async token iterator.
+    :param protocol: 1 repeats the full explanation in each token event; 2 sends only new text with a
+                     sequence number, plus a checkpoint event every checkpoint_every token events.
+    :param checkpoint_every: Token events between checkpoints in protocol 2 (0 disables checkpoints).
+    :param flush_interval_ms: Token coalescing interval, see coalesce_tokens().
+    :param flush_bytes: Token coalescing size threshold, see coalesce_tokens().
+    :return: An async generator of SSE-formatted strings.
+    """
+    yield format_sse({"type": "prediction", **prediction})
+    try:
+        summary, tokens = await explain()
+        if protocol == 1:
+            yield format_sse({"type": "header", **prediction, "summary": summary})
+        else:
+            yield format_sse({"type": "summary", "summary": summary})
+
+        explanation_text = ""
+        seq = 0
+        async for token in coalesce_tokens(tokens, flush_interval_ms, flush_bytes):
+            explanation_text += token
+            seq += 1
+            if protocol == 1:
+                yield format_sse({"type": "token", "token": token, "explanation": explanation_text})
+            else:
+                yield format_sse({"type": "token", "seq": seq, "token": token})
+                if checkpoint_every and seq % checkpoint_every == 0:
+                    yield format_sse({"type": "checkpoint", "seq": seq, "explanation": explanation_text})
+            await asyncio.sleep(0)  # yield control
+    except Exception as e:
+        # The response has already started, so errors are reported in-band
+        yield format_sse({"type": "error", "detail": str(e)})
+        return
+    yield format_sse({"type": "end"} if protocol == 1 else {"type": "end", "seq": seq})
+
+async def job_events(get_job, job_id, poll_interval=0.5):
+    """
+    Produce the server-sent events of a background job until it finishes.
+
+    A 'status' event is sent whenever the job's status or attempt count changes, followed by a
+    'result' event when the job is done or an 'error' event when it has failed for good, and an
+    'end' event.
+
+    :param get_job: Coroutine function taking a job id and returning the job dict, as JobQueue.get().
+    :param job_id: The job id.
+    :param poll_interval: Seconds between checks of the job.
+    :return: An async generator of SSE-formatted strings.
+    """
+    last = None
+    while True:
+        job = await get_job(job_id)
+        if job is None:
+            yield format_sse({"type": "error", "detail": "Unknown or expired job id"})
+            break
+        state = (job["status"], job["attempts"])
+        if state != last:
+            last = state
+            yield format_sse({"type": "status", "job_id": job_id, "status": job["status"], "attempts": job["attempts"]})
+        if job["status"] == DONE:
+            yield format_sse({"type": "result", "job_id": job_id, "result": job["result"]})
+            break
+        if job["status"] == FAILED:
+            yield format_sse({"type": "error", "job_id": job_id, "detail": job["error"]})
+            break
+        await asyncio.sleep(poll_interval)
+    yield format_sse({"type": "end"})
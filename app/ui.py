@@ -480,6 +480,26 @@ def update_statistics(result):
                 (current_avg * current_count) + new_confidence
             ) / st.session_state.statistics["total_analyzed"]
 
+def build_result_html(label, confidence, summary, explanation_text):
+    result_class = "result-genuine" if label == "Genuine" else "result-fake"
+    badge_class = "badge-genuine" if label == "Genuine" else "badge-fake"
+    explanation_html = explanation_text or "Waiting for explanation..."
+    return f"""
+    <div class="card {result_class} animate-fade-in">
+        <h3>Analysis Results</h3>
+        <p><span class="badge {badge_class}">{label}</span></p>
+        <h4>Confidence</h4>
+        <p>{confidence * 100:.1f}%</p>
+        <h4>Summary</h4>
+        <p>{summary}</p>
+        <h4>Detailed Explanation</h4>
+        <p id="explanation">{explanation_html}</p>
+    </div>
+    <script>
+        window.scrollTo({{ top: document.body.scrollHeight, behavior: 'smooth' }});
+    </script>
+    """
+
 # Dashboard tab with statistics and visualizations
 def render_dashboard():
     st.markdown(
@@ -640,7 +660,8 @@ def render_analysis_tab():
                 with st.spinner("Analyzing review... This may take a few seconds"):
                     try:
                         api_url = "http://localhost:8000/predict_with_explanation_stream"
-                        response = requests.post(api_url, json={"review": review_input}, stream=True)
+                        # Protocol 2 sends only new tokens; the explanation is rebuilt locally
+                        response = requests.post(api_url, params={"protocol": 2}, json={"review": review_input}, stream=True)
                         
                         if response.status_code == 200:
                             # Placeholder to update results in real time
@@ -649,9 +670,11 @@ def render_analysis_tab():
                             label = ""
                             summary = ""
                             explanation_text = ""
-                            result_class = ""
-                            badge_class = ""
                             confidence = 0
+                            last_seq = 0
+                            # Set when a token event was missed; tokens are then ignored until the next checkpoint
+                            out_of_sync = False
+                            sync_placeholder = st.empty()
                             
                             for line in response.iter_lines():
                                 if line:
@@ -659,43 +682,44 @@ def render_analysis_tab():
                                     if decoded_line.startswith("data: "):
                                         data_json = decoded_line[6:]
                                         data = json.loads(data_json)
-                                        if data["type"] == "header":
+                                        if data["type"] == "prediction":
+                                            # The classifier result arrives before the LLM has produced anything
                                             label = data["label"]
-                                            summary = data["summary"]
                                             confidence = data["confidence"]
-                                            result_class = "result-genuine" if label == "Genuine" else "result-fake"
-                                            badge_class = "badge-genuine" if label == "Genuine" else "badge-fake"
-                                            header_html = f"""
-                                            <div class="card {result_class} animate-fade-in">
-                                                <h3>Analysis Results</h3>
-                                                <p><span class="badge {badge_class}">{label}</span></p>
-                                                <h4>Summary</h4>
-                                                <p>{summary}</p>
-                                                <h4>Confidence</h4>
-                                                <p>{confidence:.1f}%</p>  <!-- Display confidence -->
-                                                <h4>Detailed Explanation</h4>
-                                                <p id="explanation">Waiting for explanation...</p>
-                                            </div>
-                                            """
-                                            header_placeholder.markdown(header_html, unsafe_allow_html=True)
+                                            summary = "Generating summary..."
+                                        elif data["type"] == "summary":
+                                            summary = data["summary"]
+                                        elif data["type"] == "checkpoint":
+                                            # Resync with the server's copy of the explanation
+                                            explanation_text = data["explanation"]
+                                            last_seq = data["seq"]
+                                            out_of_sync = False
+                                            sync_placeholder.empty()
                                         elif data["type"] == "token":
+                                            if out_of_sync or data["seq"] <= last_seq:
+                                                continue
+                                            if data["seq"] != last_seq + 1:
+                                                out_of_sync = True
+                                                sync_placeholder.warning("Part of the explanation was lost in transit; resynchronizing...")
+                                                continue
                                             explanation_text += data["token"]
-                                            updated_html = f"""
-                                            <div class="card {result_class} animate-fade-in">
-                                                <h3>Analysis Results</h3>
-                                                <p><span class="badge {badge_class}">{label}</span></p>
-                                                <h4>Summary</h4>
-                                                <p>{summary}</p>
-                                                <h4>Detailed Explanation</h4>
-                                                <p id="explanation">{explanation_text}</p>
-                                            </div>
-                                            <script>
-                                                window.scrollTo({{ top: document.body.scrollHeight, behavior: 'smooth' }});
-                                            </script>
-                                            """
-                                            header_placeholder.markdown(updated_html, unsafe_allow_html=True)
+                                            last_seq = data["seq"]
+                                        elif data["type"] == "error":
+                                            st.error(f"Explanation failed: {data['detail']}")
+                                            break
                                         elif data["type"] == "end":
+                                            if out_of_sync:
+                                                sync_placeholder.warning(
+                                                    "The explanation below is incomplete: some of its text was "
+                                                    "lost in transit. Please analyze the review again."
+                                                )
                                             break
+                                        else:
+                                            continue
+                                        header_placeholder.markdown(
+                                            build_result_html(label, confidence, summary, explanation_text),
+                                            unsafe_allow_html=True
+                                        )
                             
                             result = {
                                 "label": label,
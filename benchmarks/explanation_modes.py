@@ -0,0 +1,66 @@
+"""
+Compare the latency of the two-step and single-call explanation modes against a local stub LLM.
+
+Run from the project root:
+
+    python benchmarks/explanation_modes.py --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ["EXPLANATION_STORE_PATH"] = ""
+
+from langchain_core.output_parsers import StrOutputParser  # noqa: E402
+
+from benchmarks.stub_llm import StubChatModel  # noqa: E402
+from explanation import enhanced_explain  # noqa: E402
+
+REVIEW = "I can't believe how terrible this product is! It stopped working within days."
+
+async def measure(mode):
+    """
+    Time one explanation request.
+
+    :param mode: "two_step" or "single".
+    :return: Tuple of (time to summary, time to first explanation token, total time) in seconds.
+    """
+    start = time.perf_counter()
+    summary, tokens = await enhanced_explain.agenerate_explanation_stream(REVIEW, "Fake", mode=mode)
+    summary_at = time.perf_counter() - start
+    first_token_at = None
+    async for _ in tokens:
+        if first_token_at is None:
+            first_token_at = time.perf_counter() - start
+    return summary_at, first_token_at, time.perf_counter() - start
+
+async def run(mode, concurrency):
+    results = await asyncio.gather(*(measure(mode) for _ in range(concurrency)))
+    return [statistics.median(column) * 1000.0 for column in zip(*results)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--first-token-ms", type=float, default=500.0)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    stub = StubChatModel(first_token_latency=args.first_token_ms / 1000.0, token_latency=args.token_ms / 1000.0)
+    enhanced_explain.summary_runnable = enhanced_explain.summary_prompt | stub | StrOutputParser()
+    enhanced_explain.explanation_runnable = enhanced_explain.explanation_prompt | stub | StrOutputParser()
+    enhanced_explain.combined_runnable = enhanced_explain.combined_prompt | stub | StrOutputParser()
+
+    print(f"Stub LLM: {args.first_token_ms:.0f} ms to first token, {args.token_ms:.0f} ms per token, "
+          f"{args.concurrency} concurrent requests (medians)")
+    print(f"{'mode':<10}{'summary ms':>12}{'first token ms':>16}{'total ms':>10}")
+    for mode in ("two_step", "single"):
+        summary_ms, first_token_ms, total_ms = asyncio.run(run(mode, args.concurrency))
+        print(f"{mode:<10}{summary_ms:>12.0f}{first_token_ms:>16.0f}{total_ms:>10.0f}")
+
+if __name__ == "__main__":
+    main()
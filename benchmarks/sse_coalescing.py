@@ -0,0 +1,98 @@
+"""
+Measure SSE events per second and CPU time per stream with and without token coalescing.
+
+Run from the project root:
+
+    python benchmarks/sse_coalescing.py --streams 200 --tokens 400
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.streaming import explanation_events  # noqa: E402
+
+async def token_source(count, interval):
+    """
+    Yield synthetic LLM tokens at a fixed interval.
+
+    :param count: Number of tokens.
+    :param interval: Seconds between tokens.
+    """
+    for i in range(count):
+        await asyncio.sleep(interval)
+        yield f" token{i}"
+
+async def consume(events):
+    """
+    Write every event to a local socket, as the server would, and drain it on the other end.
+
+    :param events: Async iterator of SSE-formatted strings.
+    :return: Tuple of (event count, bytes sent).
+    """
+    server_sock, client_sock = socket.socketpair()
+    _, writer = await asyncio.open_connection(sock=server_sock)
+    reader, client_writer = await asyncio.open_connection(sock=client_sock)
+
+    async def drain_client():
+        while await reader.read(65536):
+            pass
+
+    client_task = asyncio.ensure_future(drain_client())
+    count = size = 0
+    async for event in events:
+        data = event.encode("utf-8")
+        writer.write(data)
+        await writer.drain()
+        count += 1
+        size += len(data)
+    writer.close()
+    await client_task
+    client_writer.close()
+    return count, size
+
+async def run(streams, tokens, interval, protocol, flush_interval_ms, flush_bytes):
+    prediction = {"label": "Fake", "confidence": 0.99}
+
+    async def explain():
+        return "", token_source(tokens, interval)
+
+    results = await asyncio.gather(*(
+        consume(explanation_events(
+            prediction, explain, protocol=protocol,
+            flush_interval_ms=flush_interval_ms, flush_bytes=flush_bytes
+        ))
+        for _ in range(streams)
+    ))
+    return sum(count for count, _ in results), sum(size for _, size in results)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=400)
+    parser.add_argument("--token-ms", type=float, default=5.0, help="Interval between LLM tokens")
+    parser.add_argument("--protocol", type=int, default=2, choices=[1, 2])
+    parser.add_argument("--flush-interval-ms", type=float, default=30.0)
+    parser.add_argument("--flush-bytes", type=int, default=256)
+    args = parser.parse_args()
+
+    print(f"{args.streams} streams x {args.tokens} tokens every {args.token_ms:g} ms, protocol {args.protocol}")
+    print(f"{'coalescing':<22}{'events':>9}{'events/s':>11}{'MB sent':>9}{'CPU ms/stream':>15}")
+    settings = [
+        ("off", 0.0, 0),
+        (f"{args.flush_interval_ms:g} ms / {args.flush_bytes} B", args.flush_interval_ms, args.flush_bytes),
+    ]
+    for name, flush_interval_ms, flush_bytes in settings:
+        wall, cpu = time.perf_counter(), time.process_time()
+        events, size = asyncio.run(run(
+            args.streams, args.tokens, args.token_ms / 1000.0, args.protocol, flush_interval_ms, flush_bytes
+        ))
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        print(f"{name:<22}{events:>9}{events / wall:>11.0f}{size / 1e6:>9.2f}{cpu * 1000.0 / args.streams:>15.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/stub_llm.py
+import asyncio
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+SUMMARY_WORDS = 60
+EXPLANATION_WORDS = 200
+
+class StubChatModel(BaseChatModel):
+    """
+    A local chat model that answers with canned text at a configurable time-to-first-token and
+    per-token latency, standing in for the OpenAI API in benchmarks.
+    """
+    first_token_latency: float = 0.5
+    token_latency: float = 0.02
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = messages[-1].content
+        summary = ["summary"] * SUMMARY_WORDS
+        explanation = ["explanation"] * EXPLANATION_WORDS
+        if "EXPLANATION:" in prompt:
+            words = ["SUMMARY:"] + summary + ["\nEXPLANATION:"] + explanation
+        elif "Summarize" in prompt:
+            words = summary
+        else:
+            words = explanation
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self.first_token_latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.first_token_latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any):
+        await asyncio.sleep(self.first_token_latency)
+        for token in self._tokens(messages):
+            await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
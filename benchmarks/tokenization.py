@@ -0,0 +1,80 @@
+"""
+Compare tokenization throughput of the slow Python tokenizer, the fast Rust tokenizer and the
+fast tokenizer behind the serving token cache.
+
+Run from the project root:
+
+    python benchmarks/tokenization.py --data data/Fake_Reviews_Detection_Dataset.csv --samples 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+from transformers import RobertaTokenizer, RobertaTokenizerFast
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.inference import LengthBucketer  # noqa: E402
+
+def load_reviews(data_path, samples):
+    """
+    Sample reviews from the dataset, or repeat a few synthetic ones when it is not available.
+
+    :param data_path: CSV file with a 'text_' column of reviews.
+    :param samples: Number of reviews.
+    :return: List of review strings.
+    """
+    if os.path.exists(data_path):
+        reviews = pd.read_csv(data_path, usecols=["text_"])["text_"].dropna()
+        return reviews.sample(min(samples, len(reviews)), random_state=0).tolist()
+    base = [
+        "Love this! Well made, sturdy, and very comfortable. I love it! Very pretty.",
+        "I can't believe how terrible this product is! It stopped working within days.",
+        "Great product, arrived on time and works exactly as described in the listing.",
+    ]
+    return [f"{base[i % len(base)]} Review number {i}." for i in range(samples)]
+
+def measure(encode, reviews, batch_size):
+    """
+    Tokenize all reviews in batches.
+
+    :param encode: Callable taking a list of reviews and returning a mapping with 'input_ids'.
+    :return: Tuple of (tokens produced, seconds taken).
+    """
+    tokens = 0
+    start = time.perf_counter()
+    for i in range(0, len(reviews), batch_size):
+        tokens += sum(len(ids) for ids in encode(reviews[i:i + batch_size])["input_ids"])
+    return tokens, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", default="data/Fake_Reviews_Detection_Dataset.csv")
+    parser.add_argument("--model-path", default="roberta-base", help="Directory or hub name of the tokenizer")
+    parser.add_argument("--samples", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-length", type=int, default=256)
+    args = parser.parse_args()
+
+    reviews = load_reviews(args.data, args.samples)
+    slow = RobertaTokenizer.from_pretrained(args.model_path)
+    fast = RobertaTokenizerFast.from_pretrained(args.model_path)
+    cached = LengthBucketer(fast, max_length=args.max_length, cache_size=len(reviews))
+    cached.encode(reviews)  # Warm the cache, as repeated reviews would in serving
+
+    settings = [
+        ("slow", lambda batch: slow(batch, truncation=True, max_length=args.max_length)),
+        ("fast", lambda batch: fast(batch, truncation=True, max_length=args.max_length)),
+        ("fast + cache (warm)", cached.encode),
+    ]
+    print(f"{len(reviews)} reviews, batch size {args.batch_size}")
+    print(f"{'tokenizer':<22}{'tokens/s':>12}{'reviews/s':>12}{'ms/batch':>10}")
+    batches = (len(reviews) + args.batch_size - 1) // args.batch_size
+    for name, encode in settings:
+        tokens, elapsed = measure(encode, reviews, args.batch_size)
+        print(f"{name:<22}{tokens / elapsed:>12.0f}{len(reviews) / elapsed:>12.0f}{elapsed * 1000.0 / batches:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Measure classification throughput and per-worker memory against the number of uvicorn workers,
+for the regular and the memory-mapped torch backends.
+
+Each configuration starts its own server with explanations disabled, waits for it to become
+ready, sends single-review /predict_batch requests from concurrent clients and then reads the
+RSS and PSS of every worker process from /proc. RSS counts the shared weights in every worker;
+PSS splits them among the workers, so the PSS total is the real footprint. Linux only.
+
+Run from the project root (after `python model_training/export.py safetensors`):
+
+    python benchmarks/workers_throughput.py --workers 1 2 4 --backends torch torch_mmap
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+REVIEWS = [
+    "Love this! Well made, sturdy, and very comfortable. I love it! Very pretty.",
+    "I can't believe how terrible this product is! It stopped working within days.",
+    "Great product, arrived on time and works exactly as described in the listing.",
+    "This is the best purchase I have ever made, everyone should buy five of them right now.",
+]
+
+def request(url, payload=None, timeout=30):
+    """
+    Send a GET request, or a POST with a JSON body when payload is given.
+
+    :return: Tuple of (status code, decoded JSON body).
+    """
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+def wait_ready(base_url, workers, timeout):
+    """
+    Poll /ready until enough consecutive probes succeed that every worker has most likely loaded.
+    """
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while streak < workers * 3:
+        if time.monotonic() > deadline:
+            raise TimeoutError("The server did not become ready in time")
+        try:
+            status, _ = request(f"{base_url}/ready", timeout=5)
+        except OSError:
+            status = None
+        streak = streak + 1 if status == 200 else 0
+        time.sleep(0.1 if status == 200 else 0.5)
+
+def worker_pids(parent_pid):
+    """
+    Find the uvicorn worker processes spawned by the server process.
+    """
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except (OSError, IndexError, ValueError):
+            continue
+        # Skip the multiprocessing resource tracker, which is also a child of the server
+        if ppid == parent_pid and b"spawn_main" in cmdline:
+            pids.append(int(entry))
+    return pids
+
+def memory_mb(pid):
+    """
+    Read the RSS and PSS of a process in MB.
+    """
+    report = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            field, _, value = line.partition(":")
+            if field in ("Rss", "Pss"):
+                report[field.lower()] = int(value.split()[0]) / 1024.0
+    return report
+
+def run_load(base_url, clients, duration):
+    """
+    Send single-review classification requests from concurrent clients for a fixed duration.
+
+    :return: Tuple of (requests per second, sorted list of latencies in ms).
+    """
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        latencies = []
+        i = index
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            status, _ = request(f"{base_url}/predict_batch", {"reviews": [REVIEWS[i % len(REVIEWS)]]})
+            if status == 200:
+                latencies.append((time.perf_counter() - start) * 1000.0)
+            i += 1
+        return latencies
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = sorted(ms for result in pool.map(client, range(clients)) for ms in result)
+    return len(latencies) / (time.monotonic() - started), latencies
+
+def run(backend, workers, args):
+    port = args.port
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, INFERENCE_BACKEND=backend, EXPLANATIONS_ENABLED="0", CACHE_ENABLED="0")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    try:
+        wait_ready(base_url, workers, args.startup_timeout)
+        throughput, latencies = run_load(base_url, args.clients, args.duration)
+        # With a single worker uvicorn serves from the server process itself, without children
+        memory = [memory_mb(pid) for pid in worker_pids(server.pid) or [server.pid]]
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "throughput": throughput,
+        "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+        "rss": sum(m["rss"] for m in memory) / max(len(memory), 1),
+        "pss": sum(m["pss"] for m in memory) / max(len(memory), 1),
+        "pss_total": sum(m["pss"] for m in memory)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch_mmap"])
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent client threads")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per configuration")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    print(f"{'backend':<12}{'workers':>8}{'req/s':>9}{'p50 ms':>9}{'RSS/worker':>12}{'PSS/worker':>12}{'PSS total':>11}")
+    for backend in args.backends:
+        for workers in args.workers:
+            row = run(backend, workers, args)
+            print(f"{backend:<12}{workers:>8}{row['throughput']:>9.1f}{row['p50']:>9.1f}"
+                  f"{row['rss']:>10.0f}MB{row['pss']:>10.0f}MB{row['pss_total']:>9.0f}MB", flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,20 @@
 # explanation/enhanced_explain.py
 import os  
+import asyncio
+import hashlib
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+import httpx
+import openai
 from langchain.chains import SequentialChain
 from langchain.prompts import PromptTemplate
 from langchain_community.chat_models import ChatOpenAI
 from langchain.chains import LLMChain
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain_core.output_parsers import StrOutputParser
 from dotenv import load_dotenv
+from explanation.store import ExplanationStore, replay_tokens
 
 load_dotenv()
 
@@ -13,8 +23,66 @@ openai_api_key = os.getenv("OPENAI_API_KEY")
 if not openai_api_key:
     raise ValueError("Please set your OPENAI_API_KEY environment variable.")
 
+LLM_MODEL_NAME = "gpt-4o"
+LLM_TEMPERATURE = 0.7
+
+# "two_step" runs the summary and explanation as two sequential LLM calls; "single" produces both
+# from one call whose output starts with the summary section
+EXPLANATION_MODE = os.getenv("EXPLANATION_MODE", "two_step")
+
+# Maximum number of explanations streamed concurrently by the synchronous (thread pool) path;
+# further requests wait for a free worker
+EXPLANATION_MAX_WORKERS = int(os.getenv("EXPLANATION_MAX_WORKERS", "16"))
+
+# Maximum number of LLM calls in flight on the asyncio path (streamed explanations and their
+# summaries). A streamed explanation holds its connection for its whole length, so this is also
+# the size of the async connection pool; further calls wait for a free slot without timing out.
+EXPLANATION_MAX_STREAMS = int(os.getenv("EXPLANATION_MAX_STREAMS", "256"))
+
+# OpenAI clients with pooled keep-alive connections, shared by every LLM call. They are passed to
+# ChatOpenAI ready-made because its http_client option is also handed to the async client, which
+# only accepts an httpx.AsyncClient.
+openai_client = openai.OpenAI(
+    api_key=openai_api_key,
+    http_client=httpx.Client(
+        limits=httpx.Limits(
+            max_connections=EXPLANATION_MAX_WORKERS * 2,
+            max_keepalive_connections=EXPLANATION_MAX_WORKERS * 2
+        ),
+        timeout=httpx.Timeout(60.0, connect=10.0)
+    )
+)
+# Calls queue on llm_slots rather than on the pool, so waiting for a pooled connection never times out
+async_openai_client = openai.AsyncOpenAI(
+    api_key=openai_api_key,
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=EXPLANATION_MAX_STREAMS,
+            max_keepalive_connections=EXPLANATION_MAX_STREAMS
+        ),
+        timeout=httpx.Timeout(60.0, connect=10.0, pool=None)
+    )
+)
+llm_slots = asyncio.Semaphore(EXPLANATION_MAX_STREAMS)
+
 # Initialize the OpenAI LLM (non-streaming instance for the synchronous chain)
-llm = ChatOpenAI(model_name="gpt-4o", temperature=0.7, openai_api_key=openai_api_key)
+llm = ChatOpenAI(
+    model_name=LLM_MODEL_NAME,
+    temperature=LLM_TEMPERATURE,
+    openai_api_key=openai_api_key,
+    client=openai_client.chat.completions,
+    async_client=async_openai_client.chat.completions
+)
+
+# Long-lived streaming instance; each request attaches its own callback handler when invoking it
+streaming_llm = ChatOpenAI(
+    model_name=LLM_MODEL_NAME,
+    temperature=LLM_TEMPERATURE,
+    streaming=True,
+    openai_api_key=openai_api_key,
+    client=openai_client.chat.completions,
+    async_client=async_openai_client.chat.completions
+)
 
 # Define prompt for summarizing the review
 summary_prompt = PromptTemplate(
@@ -40,9 +108,33 @@ Explanation:
     input_variables=["summary", "review", "label"]
 )
 
+# Define prompt producing both the summary and the explanation in a single call
+SUMMARY_MARKER = "SUMMARY:"
+EXPLANATION_MARKER = "EXPLANATION:"
+combined_prompt = PromptTemplate(
+    template="""
+You are an expert reviewer. The following product review has been classified as {label}.
+
+Review: {review}
+
+First summarize the key points of the review, then provide a detailed explanation on why this review might be considered {label}.
+Answer in exactly this format:
+
+SUMMARY: <summary>
+EXPLANATION: <explanation>
+""",
+    input_variables=["review", "label"]
+)
+
 # Create LLM chains for each step
 summary_chain = LLMChain(llm=llm, prompt=summary_prompt, output_key="summary")
 explanation_chain = LLMChain(llm=llm, prompt=explanation_prompt, output_key="explanation")
+streaming_explanation_chain = LLMChain(llm=streaming_llm, prompt=explanation_prompt, output_key="explanation")
+
+# Runnable equivalents of the two steps, used by the asyncio pipeline
+summary_runnable = summary_prompt | llm | StrOutputParser()
+explanation_runnable = explanation_prompt | streaming_llm | StrOutputParser()
+combined_runnable = combined_prompt | streaming_llm | StrOutputParser()
 
 # Combine the chains into a sequential chain
 sequential_chain = SequentialChain(
@@ -51,117 +143,249 @@ sequential_chain = SequentialChain(
     output_variables=["summary", "explanation"]
 )
 
-def generate_enhanced_explanation(review: str, label: str) -> dict:
+# Version of the prompts and LLM settings; stored explanations are only reused while it is unchanged
+PROMPT_VERSION = hashlib.sha256(
+    "\0".join([
+        LLM_MODEL_NAME, str(LLM_TEMPERATURE),
+        summary_prompt.template, explanation_prompt.template, combined_prompt.template
+    ]).encode("utf-8")
+).hexdigest()[:16]
+
+# Persistent store of generated explanations, disabled by setting EXPLANATION_STORE_PATH to an empty value
+explanation_store_path = os.getenv("EXPLANATION_STORE_PATH", "cache/explanations.sqlite3")
+explanation_store = ExplanationStore(explanation_store_path, PROMPT_VERSION) if explanation_store_path else None
+
+# Bounded pool running the streaming explanation chains
+explanation_pool = ThreadPoolExecutor(max_workers=EXPLANATION_MAX_WORKERS, thread_name_prefix="explanation")
+
+class StreamingCallbackHandler(BaseCallbackHandler):
+    """
+    Callback handler that streams tokens of a single request to a queue for asynchronous consumption.
     """
-    Generate both a summary and a detailed explanation for the given review and label using a sequential chain.
+    def __init__(self, queue):
+        """
+        :param queue: Queue receiving the generated tokens.
+        """
+        self.queue = queue
+
+    def on_llm_new_token(self, token: str, **_kwargs) -> None:
+        """
+        Invoked for each new token generated by the language model.
+        
+        :param token: The newly generated token.
+        """
+        self.queue.put(token)
+
+def split_sections(text: str):
+    """
+    Split the output of the combined prompt into its summary and explanation sections.
+    
+    :param text: The LLM output, possibly only the part received so far.
+    :return: A tuple (summary, explanation); explanation is None while its marker has not been seen.
+             Trailing whitespace of the explanation is kept, as more tokens may follow it.
+    """
+    summary, marker, explanation = text.partition(EXPLANATION_MARKER)
+    summary = summary.strip()
+    if summary.startswith(SUMMARY_MARKER):
+        summary = summary[len(SUMMARY_MARKER):].strip()
+    if not marker:
+        return summary, None
+    return summary, explanation.lstrip()
+
+def generate_enhanced_explanation(review: str, label: str, mode: str = None) -> dict:
+    """
+    Generate both a summary and a detailed explanation for the given review and label using a sequential chain,
+    or a single combined call in "single" mode.
     
     :param review: The product review text.
     :param label: The predicted label ("Fake" or "Genuine").
+    :param mode: "two_step" or "single". Defaults to EXPLANATION_MODE.
     :return: A dict containing keys 'summary' and 'explanation'.
     """
+    if explanation_store is not None:
+        stored = explanation_store.get(review, label)
+        if stored is not None:
+            return stored
     chain_input = {"review": review, "label": label}
-    result = sequential_chain(chain_input)
+    if (mode or EXPLANATION_MODE) == "single":
+        summary, explanation = split_sections(combined_runnable.invoke(chain_input))
+        if explanation is None:
+            # The model ignored the format; treat the whole answer as the explanation
+            summary, explanation = "", summary
+        result = {"summary": summary, "explanation": explanation.strip()}
+    else:
+        result = sequential_chain(chain_input)
+    if explanation_store is not None:
+        explanation_store.put(review, label, result["summary"], result["explanation"])
     return result
 
 def generate_explanation_stream(review: str, label: str):
     """
     Generate a summary synchronously and stream the detailed explanation tokens.
     
+    If the explanation is already stored, the stored summary is returned and the stored
+    explanation is replayed token by token.
+    
     :param review: The product review text.
     :param label: The predicted label ("Fake" or "Genuine").
     :return: A tuple where the first element is the summary text and the second is a token generator.
     """
+    if explanation_store is not None:
+        stored = explanation_store.get(review, label)
+        if stored is not None:
+            return stored["summary"], replay_tokens(stored["explanation"])
+
     # Get summary (non-streaming)
     summary_result = summary_chain({"review": review, "label": label})
     summary = summary_result.get("summary", "")
 
-    from queue import Queue
-    import threading
-    from langchain.callbacks.base import BaseCallbackHandler
-
     q = Queue()
 
-    # Implement the required abstract methods to avoid instantiation error
-    class StreamingCallbackHandler(BaseCallbackHandler):
-        """
-        Callback handler that streams tokens to a queue for asynchronous consumption.
-        """
-        def on_llm_new_token(self, token: str, **_kwargs) -> None:
-            """
-            Invoked for each new token generated by the language model.
-            
-            :param token: The newly generated token.
-            """
-            q.put(token)
-        def on_llm_start(self, *_args, **_kwargs):
-            del _args, _kwargs
-            pass
-        def on_llm_end(self, *_args, **_kwargs):
-            del _args, _kwargs
-            pass
-        def on_llm_error(self, *_args, **_kwargs):
-            del _args, _kwargs
-            pass
-        def on_chain_start(self, *_args, **_kwargs):
-            del _args, _kwargs
-            pass
-        def on_chain_end(self, *_args, **_kwargs):
-            del _args, _kwargs
-            pass
-        def on_chain_error(self, *_args, **_kwargs):
-            del _args, _kwargs
-            pass
-        def on_tool_start(self, *_args, **_kwargs):
-            del _args, _kwargs
-            pass
-        def on_tool_end(self, *_args, **_kwargs):
-            del _args, _kwargs
-            pass
-        def on_tool_error(self, *_args, **_kwargs):
-            del _args, _kwargs
-            pass
-        def on_text(self, *_args, **_kwargs):
-            del _args, _kwargs
-            pass
-        def on_agent_action(self, *_args, **_kwargs):
-            del _args, _kwargs
-            pass
-        def on_agent_finish(self, *_args, **_kwargs):
-            del _args, _kwargs
-            pass
-
-    from langchain.callbacks.manager import CallbackManager
-    streaming_llm = ChatOpenAI(
-        model_name="gpt-4o",
-        temperature=0.7,
-        streaming=True,
-        callback_manager=CallbackManager([StreamingCallbackHandler()]),
-        openai_api_key=openai_api_key
-    )
-    streaming_explanation_chain = LLMChain(llm=streaming_llm, prompt=explanation_prompt, output_key="explanation")
-
     def run_explanation():
         """
-        Execute the streaming explanation chain in a separate thread and put a sentinel into the queue when done.
+        Execute the shared streaming explanation chain on the worker pool and put a sentinel into the
+        queue when done, preceded by the exception if the chain failed.
         """
-        streaming_explanation_chain({"summary": summary, "review": review, "label": label})
-        q.put(None)  # Sentinel value
+        try:
+            result = streaming_explanation_chain(
+                {"summary": summary, "review": review, "label": label},
+                callbacks=[StreamingCallbackHandler(q)]
+            )
+            if explanation_store is not None:
+                explanation_store.put(review, label, summary, result["explanation"])
+        except BaseException as e:
+            q.put(e)
+        finally:
+            q.put(None)  # Sentinel value
 
-    thread = threading.Thread(target=run_explanation)
-    thread.start()
+    explanation_pool.submit(run_explanation)
 
     def token_generator():
         """
-        Yield tokens from the queue until the None sentinel is encountered.
+        Yield tokens from the queue until the None sentinel is encountered, re-raising an
+        exception of the explanation chain.
         """
         while True:
             token = q.get()
             if token is None:
                 break
+            if isinstance(token, BaseException):
+                raise token
             yield token
 
     return summary, token_generator()
 
+async def agenerate_explanation_stream(review: str, label: str, mode: str = None):
+    """
+    Asyncio counterpart of generate_explanation_stream, built on the LangChain async APIs.
+    
+    The summary is awaited and the explanation is streamed straight from the LLM response, without
+    worker threads or blocking queues, so a single event loop can serve many concurrent streams.
+    In "single" mode both come from one streamed call: the summary section is read first, and the
+    rest of the same response continues as the explanation tokens.
+    
+    :param review: The product review text.
+    :param label: The predicted label ("Fake" or "Genuine").
+    :param mode: "two_step" or "single". Defaults to EXPLANATION_MODE.
+    :return: A tuple where the first element is the summary text and the second is an async token iterator.
+    """
+    if explanation_store is not None:
+        stored = await asyncio.get_running_loop().run_in_executor(None, explanation_store.get, review, label)
+        if stored is not None:
+            async def replay():
+                for token in replay_tokens(stored["explanation"]):
+                    yield token
+            return stored["summary"], replay()
+
+    if (mode or EXPLANATION_MODE) == "single":
+        return await _agenerate_single_call_stream(review, label)
+
+    async with llm_slots:
+        summary = await summary_runnable.ainvoke({"review": review})
+
+    async def token_iterator():
+        """
+        Yield explanation tokens as they arrive and store the full explanation once complete.
+        """
+        tokens = []
+        async with llm_slots:
+            async for token in explanation_runnable.astream({"summary": summary, "review": review, "label": label}):
+                tokens.append(token)
+                yield token
+        if explanation_store is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, explanation_store.put, review, label, summary, "".join(tokens)
+            )
+
+    return summary, token_iterator()
+
+async def _agenerate_single_call_stream(review: str, label: str):
+    """
+    Stream the combined prompt, returning once its summary section is complete.
+    
+    :param review: The product review text.
+    :param label: The predicted label ("Fake" or "Genuine").
+    :return: A tuple of the summary text and an async iterator over the remaining explanation tokens.
+    """
+    # The slot is held from the start of the call until the token iterator is exhausted or closed
+    await llm_slots.acquire()
+    loop = asyncio.get_running_loop()
+    released = False
+
+    def release_slot():
+        # Also called by the garbage collector, possibly on another thread, and asyncio primitives
+        # may only be touched from their event loop
+        nonlocal released
+        if released:
+            return
+        released = True
+        try:
+            loop.call_soon_threadsafe(llm_slots.release)
+        except RuntimeError:
+            pass  # The event loop is closed, and the semaphore with it
+
+    try:
+        stream = combined_runnable.astream({"review": review, "label": label}).__aiter__()
+        received = ""
+        async for chunk in stream:
+            received += chunk
+            if EXPLANATION_MARKER in received:
+                break
+    except BaseException:
+        release_slot()
+        raise
+    summary, explanation = split_sections(received)
+    if explanation is None:
+        # The model ignored the format; treat the whole answer as the explanation
+        summary, explanation = "", summary
+
+    async def token_iterator():
+        """
+        Yield the explanation received together with the summary, then the rest of the stream.
+        """
+        tokens = [explanation] if explanation else []
+        try:
+            if explanation:
+                yield explanation
+            async for token in stream:
+                if not tokens:
+                    token = token.lstrip()
+                    if not token:
+                        continue
+                tokens.append(token)
+                yield token
+        finally:
+            release_slot()
+        if explanation_store is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, explanation_store.put, review, label, summary, "".join(tokens)
+            )
+
+    tokens = token_iterator()
+    # An iterator dropped without ever being started never runs its finally clause
+    weakref.finalize(tokens, release_slot)
+    return summary, tokens
+
 if __name__ == "__main__":
     sample_review = "I can't believe how terrible this product is! It stopped working within days."
     sample_label = "Fake"  # or "Genuine"
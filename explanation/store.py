@@ -0,0 +1,92 @@
+# explanation/store.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from app.cache import normalize_review
+
+class ExplanationStore:
+    """
+    A persistent SQLite store of generated summaries and explanations, keyed by a hash of the
+    normalized review, the label and the prompt template version.
+    """
+    def __init__(self, db_path, prompt_version):
+        """
+        :param db_path: Path of the SQLite file.
+        :param prompt_version: Identifier of the prompts and LLM settings; changing it invalidates old entries.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.prompt_version = prompt_version
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS explanations (
+                key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                explanation TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.commit()
+
+    def key(self, review, label):
+        """
+        Build the store key of a (review, label) pair.
+
+        :param review: The product review text.
+        :param label: The predicted label ("Fake" or "Genuine").
+        :return: A hex digest.
+        """
+        digest = hashlib.sha256()
+        for part in (self.prompt_version, label, normalize_review(review)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, review, label):
+        """
+        Look up a stored explanation.
+
+        :param review: The product review text.
+        :param label: The predicted label ("Fake" or "Genuine").
+        :return: A dict with keys 'summary' and 'explanation', or None if nothing is stored.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT summary, explanation FROM explanations WHERE key = ?", (self.key(review, label),)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"summary": row[0], "explanation": row[1]}
+
+    def put(self, review, label, summary, explanation):
+        """
+        Store the summary and explanation generated for a (review, label) pair.
+
+        :param review: The product review text.
+        :param label: The predicted label ("Fake" or "Genuine").
+        :param summary: The generated summary.
+        :param explanation: The generated explanation.
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO explanations (key, summary, explanation, created_at) VALUES (?, ?, ?, ?)",
+                (self.key(review, label), summary, explanation, time.time())
+            )
+            self._db.commit()
+
+def replay_tokens(text):
+    """
+    Split a stored explanation into word-sized tokens so it can be streamed like a live one.
+
+    :param text: The stored explanation.
+    :return: A generator of tokens that concatenate back to the original text.
+    """
+    for match in re.finditer(r"\s*\S+|\s+$", text):
+        yield match.group(0)
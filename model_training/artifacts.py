@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+def file_fingerprint(path, block_size=1 << 20):
+    """
+    Hash the contents of a file without reading it into memory at once.
+
+    :param path: Path of the file.
+    :param block_size: Number of bytes read at a time.
+    :return: Hex SHA-256 digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def tokenizer_fingerprint(tokenizer):
+    """
+    Hash the vocabulary, merges and normalization rules of a fast tokenizer.
+
+    The truncation and padding settings are left out, as they change with every call.
+
+    :param tokenizer: A transformers fast tokenizer.
+    :return: Hex SHA-256 digest identifying the tokenizer.
+    """
+    state = json.loads(tokenizer.backend_tokenizer.to_str())
+    state.pop("truncation", None)
+    state.pop("padding", None)
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode("utf-8")).hexdigest()
+
+def artifact_key(source_path, config, tokenizer):
+    """
+    Build the key of a preprocessing artifact.
+
+    :param source_path: Path of the raw dataset file.
+    :param config: JSON-serializable dict of the cleaning, sampling and tokenization settings.
+    :param tokenizer: The tokenizer used to encode the dataset.
+    :return: A short hex key that changes whenever the file, the settings or the tokenizer change.
+    """
+    parts = {
+        "source": file_fingerprint(source_path),
+        "config": config,
+        "tokenizer": tokenizer_fingerprint(tokenizer)
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def encode_strings(strings):
+    """
+    Pack strings into one contiguous UTF-8 byte array with offsets, so they can be stored as .npy files.
+
+    :param strings: List of strings.
+    :return: A tuple (data, offsets) where string i is data[offsets[i]:offsets[i + 1]].
+    """
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def decode_string(data, offsets, index):
+    """
+    Read one string packed by encode_strings.
+
+    :param data: The packed byte array.
+    :param offsets: The offsets array.
+    :param index: Index of the string.
+    :return: The decoded string.
+    """
+    return data[offsets[index]:offsets[index + 1]].tobytes().decode("utf-8")
+
+class ArtifactStore:
+    """
+    Directory of preprocessed datasets saved as .npy arrays, one subdirectory per artifact key.
+
+    Arrays are loaded memory-mapped copy-on-write: pages are read from disk on first access and
+    shared with the page cache, so loading is instant and nothing is copied unless written to.
+    """
+    def __init__(self, root="data/artifacts"):
+        """
+        :param root: Directory holding the artifacts.
+        """
+        self.root = root
+
+    def path(self, key):
+        """
+        :param key: Artifact key built with artifact_key().
+        :return: Directory of the artifact.
+        """
+        return os.path.join(self.root, key)
+
+    def load(self, key):
+        """
+        Memory-map the arrays of a stored artifact.
+
+        :param key: Artifact key built with artifact_key().
+        :return: A dict of array name -> memory-mapped array, or None if the artifact does not exist.
+        """
+        manifest_path = os.path.join(self.path(key), "manifest.json")
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        return {
+            name: np.load(os.path.join(self.path(key), f"{name}.npy"), mmap_mode="c")
+            for name in manifest["arrays"]
+        }
+
+    def save(self, key, arrays, metadata=None):
+        """
+        Store arrays under a key. The artifact becomes visible only once every file is written,
+        so an interrupted run never leaves a partial artifact behind.
+
+        :param key: Artifact key built with artifact_key().
+        :param arrays: Dict of array name -> numpy array (object arrays are not supported).
+        :param metadata: Optional JSON-serializable dict recorded in the manifest.
+        :return: Directory of the artifact.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{key}-", dir=self.root)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+            self._publish(staging, key, sorted(arrays), metadata)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return self.path(key)
+
+    def writer(self, key):
+        """
+        Start storing an artifact whose arrays are appended chunk by chunk, for arrays too large
+        to be built in memory.
+
+        :param key: Artifact key built with artifact_key().
+        :return: An ArtifactWriter, to be used as a context manager.
+        """
+        return ArtifactWriter(self, key)
+
+    def _publish(self, staging, key, names, metadata):
+        """
+        Write the manifest into a staging directory and move it into place as the artifact.
+        """
+        with open(os.path.join(staging, "manifest.json"), "w") as f:
+            json.dump({"arrays": names, "metadata": metadata or {}}, f, indent=2)
+        if os.path.exists(self.path(key)):
+            # Another run stored the same artifact in the meantime
+            shutil.rmtree(staging, ignore_errors=True)
+        else:
+            os.replace(staging, self.path(key))
+
+class ArtifactWriter:
+    """
+    Stores an artifact of one-dimensional arrays built by appending chunks, so memory is bounded by
+    one chunk rather than by the arrays. Chunks are appended to raw files in a staging directory,
+    which are turned into .npy files on commit(). Like ArtifactStore.save(), the artifact only
+    becomes visible once complete; leaving the context without committing discards it.
+    """
+    def __init__(self, store, key):
+        """
+        :param store: The ArtifactStore receiving the artifact.
+        :param key: Artifact key built with artifact_key().
+        """
+        self.store = store
+        self.key = key
+        os.makedirs(store.root, exist_ok=True)
+        self.staging = tempfile.mkdtemp(prefix=f".{key}-", dir=store.root)
+        self._arrays = {}  # name -> [raw file, dtype, length]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._close_files()
+        if os.path.isdir(self.staging):
+            shutil.rmtree(self.staging, ignore_errors=True)
+
+    def append(self, name, values):
+        """
+        Append values to an array, creating it on first use.
+
+        :param name: Array name.
+        :param values: One-dimensional numpy array; its dtype must match earlier chunks of the array.
+        """
+        values = np.ascontiguousarray(values)
+        if name not in self._arrays:
+            self._arrays[name] = [open(os.path.join(self.staging, f"{name}.raw"), "wb"), values.dtype, 0]
+        entry = self._arrays[name]
+        if values.dtype != entry[1]:
+            raise ValueError(f"Cannot append {values.dtype} values to {entry[1]} array '{name}'")
+        entry[0].write(values.tobytes())
+        entry[2] += len(values)
+
+    def commit(self, metadata=None):
+        """
+        Convert the appended arrays to .npy files and publish the artifact.
+
+        :param metadata: Optional JSON-serializable dict recorded in the manifest.
+        :return: Directory of the artifact.
+        """
+        self._close_files()
+        for name, (_, dtype, length) in self._arrays.items():
+            raw_path = os.path.join(self.staging, f"{name}.raw")
+            with open(os.path.join(self.staging, f"{name}.npy"), "wb") as out, open(raw_path, "rb") as raw:
+                np.lib.format.write_array_header_2_0(out, {
+                    "descr": np.lib.format.dtype_to_descr(dtype),
+                    "fortran_order": False,
+                    "shape": (length,)
+                })
+                shutil.copyfileobj(raw, out, 1 << 20)
+            os.remove(raw_path)
+        self.store._publish(self.staging, self.key, sorted(self._arrays), metadata)
+        return self.store.path(self.key)
+
+    def _close_files(self):
+        for entry in self._arrays.values():
+            entry[0].close()
@@ -0,0 +1,249 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from sklearn.metrics import accuracy_score, f1_score
+from transformers import AutoModelForSequenceClassification, TrainingArguments
+
+from train import (
+    TRAIN_SEED, TRAINING_PROFILE, PaddingCollator, ReviewDataset, ReviewTrainer, ThroughputCallback,
+    compute_metrics, load_encoded_dataset, tokenizer, training_profile_args
+)
+
+TEACHER_PATH = "model/final_model"
+# The student must share the teacher's tokenizer, so that the stored datasets and the serving
+# tokenizer can be reused; DistilRoBERTa does
+STUDENT_BASE = "distilroberta-base"
+STUDENT_PATH = "model/student_model"
+
+class DistillationDataset(ReviewDataset):
+    """
+    ReviewDataset whose samples also carry the teacher's logits for the review.
+    """
+    def __init__(self, encodings, labels, teacher_logits):
+        """
+        :param encodings: Dict with the packed 'input_ids' array and its 'offsets'.
+        :param labels: Array of labels, one per review.
+        :param teacher_logits: Array of shape (reviews, num_labels) with the teacher's logits.
+        """
+        super().__init__(encodings, labels)
+        self.teacher_logits = teacher_logits
+
+    def __getitem__(self, idx):
+        item = super().__getitem__(idx)
+        item["teacher_logits"] = torch.from_numpy(self.teacher_logits[idx])
+        return item
+
+class DistillationTrainer(ReviewTrainer):
+    """
+    Trainer optimizing a mix of the usual cross-entropy on the labels and the KL divergence between
+    the temperature-softened student and teacher distributions.
+    """
+    def __init__(self, *args, temperature=2.0, alpha=0.5, **kwargs):
+        """
+        :param temperature: Softmax temperature applied to both models' logits.
+        :param alpha: Weight of the label loss; the distillation loss gets 1 - alpha.
+        """
+        super().__init__(*args, **kwargs)
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        teacher_logits = inputs.pop("teacher_logits", None)
+        if teacher_logits is None and model.training:
+            raise ValueError(
+                "Training batch without teacher_logits; the distillation TrainingArguments "
+                "need remove_unused_columns=False"
+            )
+        outputs = model(**inputs)
+        loss = outputs.loss
+        if teacher_logits is not None:
+            t = self.temperature
+            # Scaled by t^2 so that its gradients stay comparable to the label loss
+            distillation_loss = F.kl_div(
+                F.log_softmax(outputs.logits / t, dim=-1),
+                F.softmax(teacher_logits.to(outputs.logits.dtype) / t, dim=-1),
+                reduction="batchmean"
+            ) * t * t
+            loss = self.alpha * loss + (1 - self.alpha) * distillation_loss
+        return (loss, outputs) if return_outputs else loss
+
+def predict_logits(model, dataset, batch_size=64):
+    """
+    Run a model over a dataset in order.
+
+    :param model: A sequence classification model.
+    :param dataset: A ReviewDataset.
+    :param batch_size: Number of reviews per forward pass.
+    :return: Array of shape (reviews, num_labels) with the logits.
+    """
+    collator = PaddingCollator(tokenizer.pad_token_id)
+    model.eval()
+    logits = []
+    with torch.inference_mode():
+        for start in range(0, len(dataset), batch_size):
+            batch = collator([dataset[i] for i in range(start, min(start + batch_size, len(dataset)))])
+            batch.pop("labels")
+            logits.append(model(**batch).logits.float().numpy())
+    return np.concatenate(logits)
+
+def measure_latency(model, dataset, batch_size, batches=20):
+    """
+    Measure the mean forward-pass time per review.
+
+    :param model: A sequence classification model.
+    :param dataset: A ReviewDataset providing the reviews.
+    :param batch_size: Number of reviews per forward pass, capped at the size of the dataset.
+    :param batches: Number of timed forward passes, capped by the size of the dataset.
+    :return: Milliseconds per review.
+    """
+    if not len(dataset):
+        raise ValueError("Cannot measure latency on an empty dataset")
+    collator = PaddingCollator(tokenizer.pad_token_id)
+    batch_size = min(batch_size, len(dataset))
+    available = len(dataset) // batch_size
+    # The first pass is a warm-up, unless the dataset only holds one batch
+    warmup = 1 if available > 1 else 0
+    batches = min(batches, available - warmup)
+    elapsed = 0.0
+    with torch.inference_mode():
+        for i in range(warmup + batches):
+            batch = collator([dataset[j] for j in range(i * batch_size, (i + 1) * batch_size)])
+            batch.pop("labels")
+            start = time.perf_counter()
+            model(**batch)
+            if i >= warmup:
+                elapsed += time.perf_counter() - start
+    return elapsed * 1000.0 / (batches * batch_size)
+
+def compare(teacher, student, dataset, labels, threshold=0.9):
+    """
+    Print the accuracy, F1 and latency of the teacher and the student side by side, together with
+    the student escalating reviews classified with a confidence below threshold to the teacher.
+
+    :param teacher: The teacher model.
+    :param student: The distilled student model.
+    :param dataset: The test ReviewDataset.
+    :param labels: The test labels.
+    :param threshold: Escalation threshold, as ESCALATION_THRESHOLD in app/config.py.
+    :return: A dict of model name -> metrics dict.
+    """
+    labels = np.asarray(labels)
+    teacher_probs = torch.softmax(torch.from_numpy(predict_logits(teacher, dataset)), dim=1).numpy()
+    student_probs = torch.softmax(torch.from_numpy(predict_logits(student, dataset)), dim=1).numpy()
+    escalated = student_probs.max(axis=1) < threshold
+    cascade_probs = np.where(escalated[:, None], teacher_probs, student_probs)
+
+    report = {}
+    for name, model, probs in (("teacher", teacher, teacher_probs), ("student", student, student_probs)):
+        predictions = probs.argmax(axis=1)
+        report[name] = {
+            "parameters": sum(p.numel() for p in model.parameters()),
+            "accuracy": accuracy_score(labels, predictions),
+            "f1": f1_score(labels, predictions, average="weighted"),
+            "ms_per_review_batch_1": measure_latency(model, dataset, batch_size=1),
+            "ms_per_review_batch_32": measure_latency(model, dataset, batch_size=32)
+        }
+    # Escalated reviews pay for both models
+    report["cascade"] = {
+        "parameters": report["teacher"]["parameters"] + report["student"]["parameters"],
+        "accuracy": accuracy_score(labels, cascade_probs.argmax(axis=1)),
+        "f1": f1_score(labels, cascade_probs.argmax(axis=1), average="weighted"),
+        "ms_per_review_batch_1": report["student"]["ms_per_review_batch_1"]
+                                 + escalated.mean() * report["teacher"]["ms_per_review_batch_1"],
+        "ms_per_review_batch_32": report["student"]["ms_per_review_batch_32"]
+                                  + escalated.mean() * report["teacher"]["ms_per_review_batch_32"],
+        "escalation_rate": float(escalated.mean())
+    }
+
+    print(f"Teacher vs student on {len(labels)} test reviews "
+          f"(cascade escalates {escalated.mean():.1%} of reviews below confidence {threshold:g}):")
+    print(f"{'model':<10}{'params':>8}{'accuracy':>10}{'F1':>8}{'ms/review bs=1':>16}{'ms/review bs=32':>17}")
+    for name, row in report.items():
+        print(f"{name:<10}{row['parameters'] / 1e6:>7.0f}M{row['accuracy']:>10.4f}{row['f1']:>8.4f}"
+              f"{row['ms_per_review_batch_1']:>16.2f}{row['ms_per_review_batch_32']:>17.2f}")
+    teacher_row, student_row = report["teacher"], report["student"]
+    print(f"{'delta':<10}{'':>8}{student_row['accuracy'] - teacher_row['accuracy']:>+10.4f}"
+          f"{student_row['f1'] - teacher_row['f1']:>+8.4f}"
+          f"{teacher_row['ms_per_review_batch_1'] / student_row['ms_per_review_batch_1']:>15.2f}x"
+          f"{teacher_row['ms_per_review_batch_32'] / student_row['ms_per_review_batch_32']:>16.2f}x")
+    return report
+
+def distill(teacher_path=TEACHER_PATH, student_base=STUDENT_BASE, student_path=STUDENT_PATH,
+            temperature=2.0, alpha=0.5, epochs=4, threshold=0.9):
+    """
+    Train a student model on the teacher's logits and the labels, save it and compare it with the teacher.
+
+    The dataset is loaded through the same artifact store and settings as train.py, so the student
+    is trained and evaluated on the teacher's own train/test split.
+
+    :param teacher_path: Directory of the fine-tuned teacher model.
+    :param student_base: Pretrained model the student is initialized from.
+    :param student_path: Directory the student model and tokenizer are saved to.
+    :param temperature: Softmax temperature of the distillation loss.
+    :param alpha: Weight of the label loss against the distillation loss.
+    :param epochs: Number of training epochs.
+    :param threshold: Escalation threshold used in the comparison.
+    :return: None
+    """
+    profile_args = training_profile_args(TRAINING_PROFILE)
+    training_args = TrainingArguments(
+        output_dir=os.path.join(student_path, "checkpoints"),
+        num_train_epochs=epochs,
+        weight_decay=0.01,
+        logging_dir="logs/",
+        evaluation_strategy="epoch",
+        save_strategy="epoch",
+        load_best_model_at_end=True,
+        logging_steps=10,
+        group_by_length=True,
+        # Keep teacher_logits, which is not an argument of the model's forward()
+        remove_unused_columns=False,
+        **profile_args
+    )
+
+    with training_args.main_process_first(desc="dataset preprocessing"):
+        encodings, train_labels, test_labels = load_encoded_dataset(seed=TRAIN_SEED)
+    test_dataset = ReviewDataset(encodings["test"], test_labels)
+
+    # The teacher's logits are computed once up front rather than in every epoch
+    teacher = AutoModelForSequenceClassification.from_pretrained(teacher_path)
+    print("Computing teacher logits...")
+    teacher_logits = predict_logits(teacher, ReviewDataset(encodings["train"], train_labels))
+    train_dataset = DistillationDataset(encodings["train"], train_labels, teacher_logits)
+
+    student = AutoModelForSequenceClassification.from_pretrained(student_base, num_labels=2)
+    trainer = DistillationTrainer(
+        model=student,
+        args=training_args,
+        train_dataset=train_dataset,
+        eval_dataset=test_dataset,
+        data_collator=PaddingCollator(tokenizer.pad_token_id),
+        compute_metrics=compute_metrics,
+        callbacks=[ThroughputCallback()],
+        temperature=temperature,
+        alpha=alpha
+    )
+
+    print("Starting distillation...")
+    trainer.train()
+    trainer.save_model(student_path)
+    if trainer.is_world_process_zero():
+        tokenizer.save_pretrained(student_path)
+        print(f"Student model saved to {student_path}")
+        compare(teacher, trainer.model, test_dataset, test_labels, threshold=threshold)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distill the fine-tuned model into a smaller student.")
+    parser.add_argument("--teacher", default=TEACHER_PATH)
+    parser.add_argument("--student-base", default=STUDENT_BASE)
+    parser.add_argument("--output", default=STUDENT_PATH)
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--epochs", type=int, default=4)
+    parser.add_argument("--threshold", type=float, default=0.9, help="Escalation threshold for the comparison")
+    args = parser.parse_args()
+    distill(args.teacher, args.student_base, args.output, args.temperature, args.alpha, args.epochs, args.threshold)
@@ -0,0 +1,135 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+from transformers import RobertaForSequenceClassification, RobertaTokenizerFast
+
+# Allow importing the serving backends from app/ when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from app.backends import load_backend  # noqa: E402
+
+MODEL_PATH = "model/final_model"
+
+def export_onnx(model_path=MODEL_PATH, onnx_file="model.onnx", opset=17):
+    """
+    Export the fine-tuned model to an ONNX graph with dynamic batch and sequence dimensions.
+    
+    :param model_path: Directory of the fine-tuned model; the graph is written next to its weights.
+    :param onnx_file: File name of the exported graph.
+    :param opset: ONNX opset version.
+    :return: Path of the exported graph.
+    """
+    tokenizer = RobertaTokenizerFast.from_pretrained(model_path)
+    model = RobertaForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+    model.config.return_dict = False
+    
+    dummy = tokenizer(["An example review used to trace the graph."], return_tensors="pt")
+    onnx_path = os.path.join(model_path, onnx_file)
+    torch.onnx.export(
+        model,
+        (dummy["input_ids"], dummy["attention_mask"]),
+        onnx_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"}
+        },
+        opset_version=opset
+    )
+    print(f"Exported ONNX graph to {onnx_path}")
+    return onnx_path
+
+def export_safetensors(model_path=MODEL_PATH):
+    """
+    Re-save the fine-tuned model weights as model.safetensors, the format memory-mapped by the
+    "torch_mmap" serving backend. Models saved by older transformers versions only have pytorch_model.bin.
+    
+    :param model_path: Directory of the fine-tuned model; the weights are written into it.
+    :return: Path of the safetensors file.
+    """
+    model = RobertaForSequenceClassification.from_pretrained(model_path)
+    model.save_pretrained(model_path, safe_serialization=True)
+    weights_path = os.path.join(model_path, "model.safetensors")
+    print(f"Saved safetensors weights to {weights_path}")
+    return weights_path
+
+def check_parity(backends, data_path, model_path=MODEL_PATH, samples=500, batch_size=32, max_length=256):
+    """
+    Compare serving backends against the fp32 PyTorch model on reviews from the dataset.
+    
+    Reports, per backend, the fraction of reviews given the same label as fp32, the mean and
+    maximum absolute drift of the 'Fake' probability, and the mean time per batch.
+    
+    :param backends: Names of the backends to compare (see app/backends.py).
+    :param data_path: CSV file with a 'text_' column of reviews.
+    :param model_path: Directory of the fine-tuned model.
+    :param samples: Number of reviews to compare on.
+    :param batch_size: Number of reviews per forward pass.
+    :param max_length: Maximum sequence length.
+    :return: A dict of backend name -> metrics dict.
+    """
+    reviews = pd.read_csv(data_path)["text_"].dropna()
+    reviews = reviews.sample(min(samples, len(reviews)), random_state=0).tolist()
+    tokenizer = RobertaTokenizerFast.from_pretrained(model_path)
+    batches = [
+        tokenizer(reviews[i:i + batch_size], return_tensors="pt", truncation=True, padding=True, max_length=max_length)
+        for i in range(0, len(reviews), batch_size)
+    ]
+    
+    def run(backend):
+        probs, elapsed = [], 0.0
+        with torch.inference_mode():
+            for inputs in batches:
+                start = time.perf_counter()
+                logits = backend.logits(inputs)
+                elapsed += time.perf_counter() - start
+                probs.append(torch.softmax(logits, dim=1).numpy())
+        return np.concatenate(probs), elapsed / len(batches) * 1000.0
+    
+    reference, reference_ms = run(load_backend("torch", model_path))
+    report = {"torch": {"agreement": 1.0, "mean_drift": 0.0, "max_drift": 0.0, "ms_per_batch": reference_ms}}
+    for name in backends:
+        if name == "torch":
+            continue
+        probs, ms = run(load_backend(name, model_path))
+        drift = np.abs(probs[:, 1] - reference[:, 1])
+        report[name] = {
+            "agreement": float((probs.argmax(1) == reference.argmax(1)).mean()),
+            "mean_drift": float(drift.mean()),
+            "max_drift": float(drift.max()),
+            "ms_per_batch": ms
+        }
+    
+    print(f"Parity against fp32 on {len(reviews)} reviews (batch size {batch_size}):")
+    print(f"{'backend':<12}{'agreement':>11}{'mean drift':>12}{'max drift':>11}{'ms/batch':>10}")
+    for name, row in report.items():
+        print(f"{name:<12}{row['agreement']:>11.2%}{row['mean_drift']:>12.4f}{row['max_drift']:>11.4f}{row['ms_per_batch']:>10.1f}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the fine-tuned model for serving and check backend parity.")
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    subparsers.add_parser("onnx", help="Export the model to model.onnx inside --model-path")
+    subparsers.add_parser("safetensors", help="Save the weights as model.safetensors inside --model-path")
+    
+    parity_parser = subparsers.add_parser("parity", help="Compare backends against the fp32 model")
+    parity_parser.add_argument("--data", default="data/Fake_Reviews_Detection_Dataset.csv")
+    parity_parser.add_argument("--backends", nargs="+", default=["torch_int8", "torch_mmap", "onnx"])
+    parity_parser.add_argument("--samples", type=int, default=500)
+    
+    args = parser.parse_args()
+    if args.command == "onnx":
+        export_onnx(args.model_path)
+    elif args.command == "safetensors":
+        export_safetensors(args.model_path)
+    else:
+        check_parity(args.backends, args.data, model_path=args.model_path, samples=args.samples)
@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+TRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "train.py")
+
+def launch(nproc, max_steps=-1, output_dir=None, metrics_file=None, evaluate=True, extra_env=None):
+    """
+    Run train.py as nproc data-parallel processes on this machine with torchrun.
+
+    Each process trains on its own shard of the training set with its share of the CPU cores, and
+    gradients are averaged over the gloo backend. To span several machines, run torchrun yourself
+    on each one with --nnodes, --node_rank and --master_addr.
+
+    :param nproc: Number of local processes.
+    :param max_steps: Optional cap on the number of optimizer steps (-1 trains for the full epochs).
+    :param output_dir: Directory for checkpoints and the final model (train.py's default when None).
+    :param metrics_file: Optional path of a JSON file receiving the throughput of the run.
+    :param evaluate: Evaluate and checkpoint at the end of every epoch; disable for timing runs.
+    :param extra_env: Additional environment variables for the training processes.
+    :return: The exit code of torchrun.
+    """
+    env = dict(os.environ, TRAINING_PROFILE=os.getenv("TRAINING_PROFILE", "cpu"), TRAIN_MAX_STEPS=str(max_steps))
+    if output_dir:
+        env["TRAIN_OUTPUT_DIR"] = output_dir
+    if metrics_file:
+        env["TRAIN_METRICS_FILE"] = metrics_file
+    if not evaluate:
+        env["TRAIN_EVAL_STRATEGY"] = "no"
+    env.update(extra_env or {})
+    command = [
+        sys.executable, "-m", "torch.distributed.run",
+        "--standalone", f"--nproc_per_node={nproc}",
+        TRAIN_SCRIPT
+    ]
+    return subprocess.run(command, env=env).returncode
+
+def scaling_report(process_counts, max_steps):
+    """
+    Train for a fixed number of steps with each process count and report the scaling efficiency.
+
+    Every process keeps the same per-process batch size, so the global batch grows with the number
+    of processes (weak scaling). Efficiency is the speedup over one process divided by the number
+    of processes. Evaluation and checkpointing are disabled: with more processes the same number of
+    steps crosses more epoch boundaries, and their eval passes and checkpoint writes would otherwise
+    be timed too. Run once without timing first, or keep ARTIFACTS_DIR set, so that preprocessing
+    is not repeated for every configuration.
+
+    :param process_counts: Numbers of processes to compare.
+    :param max_steps: Optimizer steps per configuration.
+    :return: A dict of process count -> metrics dict.
+    """
+    report = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for nproc in process_counts:
+            metrics_file = os.path.join(workdir, f"metrics_{nproc}.json")
+            code = launch(
+                nproc, max_steps=max_steps, output_dir=os.path.join(workdir, f"model_{nproc}"),
+                metrics_file=metrics_file, evaluate=False
+            )
+            if code != 0:
+                print(f"Training with {nproc} processes failed with exit code {code}")
+                continue
+            with open(metrics_file) as f:
+                report[nproc] = json.load(f)
+
+    if not report:
+        return report
+    base_nproc = min(report)
+    base = report[base_nproc]["samples_per_second"] / base_nproc
+    print(f"Scaling over {max_steps} steps (per-process batch size fixed):")
+    print(f"{'processes':<11}{'samples/s':>11}{'speedup':>9}{'efficiency':>12}")
+    for nproc, row in sorted(report.items()):
+        speedup = row["samples_per_second"] / base
+        print(f"{nproc:<11}{row['samples_per_second']:>11.1f}{speedup:>9.2f}{speedup / nproc:>12.0%}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed data-parallel CPU training over gloo.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="Train the model with several local processes")
+    train_parser.add_argument("--nproc", type=int, default=2)
+
+    scaling_parser = subparsers.add_parser("scaling", help="Report throughput and scaling efficiency")
+    scaling_parser.add_argument("--nproc", type=int, nargs="+", default=[1, 2, 4])
+    scaling_parser.add_argument("--max-steps", type=int, default=30)
+
+    args = parser.parse_args()
+    if args.command == "train":
+        sys.exit(launch(args.nproc))
+    scaling_report(args.nproc, args.max_steps)
@@ -1,40 +1,129 @@
+import hashlib
+import inspect
+import os
+import time
+from itertools import chain, islice
+
 import pandas as pd
 import spacy
 from nltk.corpus import stopwords
-from transformers import RobertaTokenizer
+from transformers import RobertaTokenizerFast
 import numpy as np
 
-nlp = spacy.load("en_core_web_sm")
-tokenizer = RobertaTokenizer.from_pretrained("roberta-base")
+# Cleaning only needs lemmas, stopword flags and is_alpha, so the parser and NER are never loaded
+nlp = spacy.load("en_core_web_sm", exclude=["parser", "ner"])
+tokenizer = RobertaTokenizerFast.from_pretrained("roberta-base")
 stop_words = set(stopwords.words("english"))
 
-def load_data(file_path):
+# Source column -> column name used in training, and source label -> class id
+COLUMNS = {
+    "text_": "review_text",
+    "label": "label"
+}
+LABEL_MAP = {"CG": 0, "OR": 1}  # Adjust based on your dataset
+
+# Reviews are truncated to this many tokens
+MAX_LENGTH = 256
+
+# Worker processes and batch size used by spaCy when cleaning reviews. Every worker loads its own
+# copy of the spaCy model, so the default stays small; fewer than CLEAN_PARALLEL_MIN_TEXTS reviews
+# are cleaned in the current process, where starting workers would cost more than it saves.
+CLEAN_PROCESSES = int(os.getenv("CLEAN_PROCESSES", str(min(4, os.cpu_count() or 1))))
+CLEAN_BATCH_SIZE = int(os.getenv("CLEAN_BATCH_SIZE", "1000"))
+CLEAN_PARALLEL_MIN_TEXTS = int(os.getenv("CLEAN_PARALLEL_MIN_TEXTS", "10000"))
+
+def iter_data(file_path, chunk_size=100_000):
     """
-    Load a dataset from a CSV file, rename columns, handle missing values, and map labels.
+    Stream a dataset from a CSV, Parquet or JSONL file in chunks, renaming columns, dropping missing
+    values and mapping labels chunk by chunk. Only one chunk is held in memory at a time.
     
-    :param file_path: Path to the CSV file containing the review data.
-    :return: A sampled pandas DataFrame with columns 'review_text' and 'label'.
+    :param file_path: Path to the data file; the format is taken from its extension
+                      (.parquet/.pq, .jsonl/.ndjson, anything else is read as CSV).
+    :param chunk_size: Number of source rows per chunk.
+    :return: A generator of pandas DataFrames with columns 'review_text' and 'label'.
     """
-    df = pd.read_csv(file_path)
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in (".parquet", ".pq"):
+        import pyarrow.parquet as pq
+        
+        batches = pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size, columns=list(COLUMNS))
+        chunks = (batch.to_pandas() for batch in batches)
+    elif extension in (".jsonl", ".ndjson"):
+        chunks = pd.read_json(file_path, lines=True, chunksize=chunk_size)
+    else:
+        chunks = pd.read_csv(file_path, usecols=list(COLUMNS), chunksize=chunk_size)
     
-    df = df.rename(columns={
-        "text_": "review_text",
-        "label": "label"
-    })
-    df = df[["review_text", "label"]].dropna()
+    for chunk in chunks:
+        chunk = chunk.rename(columns=COLUMNS)[["review_text", "label"]].dropna()
+        chunk["label"] = chunk["label"].map(LABEL_MAP)
+        yield chunk
+
+def reservoir_sample(chunks, sample_size, seed=None):
+    """
+    Draw a uniform random sample of rows from a stream of DataFrames in a single pass, holding at
+    most sample_size rows plus the current chunk in memory.
     
-    df["label"] = df["label"].map({"CG": 0, "OR": 1})  # Adjust based on your dataset
+    :param chunks: Iterable of DataFrames sharing the same columns.
+    :param sample_size: Number of rows to sample.
+    :param seed: Optional random seed.
+    :return: A DataFrame of min(sample_size, total rows) rows.
+    """
+    rng = np.random.default_rng(seed)
+    reservoir = None
+    filled = seen = 0
+    for chunk in chunks:
+        if reservoir is None:
+            reservoir = {column: np.empty(sample_size, dtype=object) for column in chunk.columns}
+        values = {column: chunk[column].to_numpy() for column in chunk.columns}
+        
+        # Fill the reservoir with the first sample_size rows
+        take = min(sample_size - filled, len(chunk))
+        for column, array in reservoir.items():
+            array[filled:filled + take] = values[column][:take]
+        filled += take
+        
+        # Row number i (0-based, over the whole stream) replaces a random slot with probability sample_size / (i + 1)
+        rows = np.arange(take, len(chunk))
+        slots = rng.integers(0, seen + rows + 1)
+        replace = slots < sample_size
+        rows, slots = rows[replace], slots[replace]
+        # When several rows of the chunk hit the same slot, the last one wins
+        _, last = np.unique(slots[::-1], return_index=True)
+        keep = len(slots) - 1 - last
+        for column, array in reservoir.items():
+            array[slots[keep]] = values[column][rows[keep]]
+        seen += len(chunk)
     
-    return df.sample(2000)
+    if reservoir is None:
+        return pd.DataFrame(columns=["review_text", "label"])
+    return pd.DataFrame({column: array[:filled] for column, array in reservoir.items()}).infer_objects()
 
-def clean_text(text):
+def load_data(file_path, sample_size=2000, chunk_size=100_000, seed=None):
     """
-    Perform text cleaning using spaCy to remove stopwords and non-alphabetic tokens, then lemmatize the text.
+    Load a dataset from a CSV, Parquet or JSONL file, rename columns, handle missing values, and map labels.
     
-    :param text: The raw text to be cleaned.
+    The file is streamed in chunks, so memory stays bounded by the sample rather than by the size
+    of the file. With sample_size=None the whole file ends up in one DataFrame; for a full pass over
+    a large corpus use iter_encoded_batches() instead.
+    
+    :param file_path: Path to the file containing the review data.
+    :param sample_size: Number of reviews to sample uniformly, or None to keep every review.
+    :param chunk_size: Number of rows read at a time.
+    :param seed: Optional random seed for the sample.
+    :return: A pandas DataFrame with columns 'review_text' and 'label'.
+    """
+    chunks = iter_data(file_path, chunk_size=chunk_size)
+    if sample_size is None:
+        return pd.concat(list(chunks), ignore_index=True)
+    return reservoir_sample(chunks, sample_size, seed=seed)
+
+def _clean_doc(doc):
+    """
+    Keep the lowercased lemmas of the alphabetic, non-stopword tokens longer than two characters.
+    
+    :param doc: A spaCy Doc.
     :return: A cleaned string representing the lemmatized tokens.
     """
-    doc = nlp(text)
     cleaned = [
         token.lemma_.lower()
         for token in doc
@@ -44,34 +133,128 @@ def clean_text(text):
     ]
     return " ".join(cleaned)
 
-def preprocess_data(df, test_size=0.2):
+def clean_text(text):
+    """
+    Perform text cleaning using spaCy to remove stopwords and non-alphabetic tokens, then lemmatize the text.
+    
+    :param text: The raw text to be cleaned.
+    :return: A cleaned string representing the lemmatized tokens.
+    """
+    return _clean_doc(nlp(text))
+
+def clean_texts(texts, n_process=CLEAN_PROCESSES, batch_size=CLEAN_BATCH_SIZE, total=None, log_every=10_000,
+                as_tuples=False):
+    """
+    Clean a stream of texts with batched nlp.pipe across n_process worker processes, printing
+    progress and throughput every log_every texts.
+    
+    :param texts: Iterable of raw texts, or of (text, context) tuples when as_tuples is set.
+    :param n_process: Number of worker processes (1 cleans in the current process, as does a known
+                      total below CLEAN_PARALLEL_MIN_TEXTS).
+    :param batch_size: Number of texts sent to a worker at a time.
+    :param total: Number of texts, if known, shown in the progress readout.
+    :param log_every: Number of texts between progress lines.
+    :param as_tuples: Pass a context value through alongside each text.
+    :return: A generator of cleaned strings, or of (cleaned, context) tuples, in input order.
+    """
+    if total is not None and total < CLEAN_PARALLEL_MIN_TEXTS:
+        n_process = 1
+    start = time.perf_counter()
+    done = 0
+    for item in nlp.pipe(texts, n_process=n_process, batch_size=batch_size, as_tuples=as_tuples):
+        yield (_clean_doc(item[0]), item[1]) if as_tuples else _clean_doc(item)
+        done += 1
+        if done % log_every == 0:
+            elapsed = time.perf_counter() - start
+            progress = f"{done}/{total}" if total else str(done)
+            print(f"Cleaned {progress} reviews ({done / elapsed:.0f} reviews/s)")
+    elapsed = time.perf_counter() - start
+    print(f"Cleaned {done} reviews in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.0f} reviews/s, {n_process} processes)")
+
+def preprocessing_config():
+    """
+    Describe the cleaning and tokenization settings, for keying stored preprocessing artifacts.
+    
+    :return: A JSON-serializable dict that changes whenever cleaned or tokenized output could change.
+    """
+    return {
+        "spacy_model": f"{nlp.meta['lang']}_{nlp.meta['name']}-{nlp.meta['version']}",
+        "spacy_pipeline": nlp.pipe_names,
+        "cleaning": hashlib.sha256(inspect.getsource(_clean_doc).encode("utf-8")).hexdigest(),
+        "columns": COLUMNS,
+        "label_map": LABEL_MAP,
+        "max_length": MAX_LENGTH,
+        "token_format": "packed-int32"
+    }
+
+def pack_token_ids(token_ids):
     """
-    Tokenize cleaned text using a Roberta tokenizer, then split the dataset into training and test sets.
+    Pack variable-length token id lists into one contiguous array with offsets, without padding.
+    
+    :param token_ids: List of token id lists.
+    :return: A dict with 'input_ids', an int32 array holding every sequence back to back, and
+             'offsets', an int64 array where sequence i is input_ids[offsets[i]:offsets[i + 1]].
+    """
+    offsets = np.zeros(len(token_ids) + 1, dtype=np.int64)
+    np.cumsum([len(ids) for ids in token_ids], out=offsets[1:])
+    input_ids = np.fromiter(chain.from_iterable(token_ids), dtype=np.int32, count=int(offsets[-1]))
+    return {"input_ids": input_ids, "offsets": offsets}
+
+def preprocess_data(df, test_size=0.2, n_process=CLEAN_PROCESSES):
+    """
+    Tokenize cleaned text in one batched call of the fast (Rust-backed) Roberta tokenizer, then split the dataset into training and test sets.
+    Each split is packed with pack_token_ids().
     
     :param df: Pandas DataFrame containing 'review_text' and 'label'.
     :param test_size: Fraction of data to use for testing. Defaults to 0.2.
+    :param n_process: Number of spaCy worker processes used for cleaning.
     :return: A tuple containing encoded train/test data and the corresponding label arrays.
     """
-    df["cleaned_text"] = df["review_text"].apply(clean_text)
+    df["cleaned_text"] = list(clean_texts(df["review_text"].tolist(), n_process=n_process, total=len(df)))
     
-    encodings = tokenizer(
-        df["cleaned_text"].tolist(),
-        truncation=True,
-        padding=True,
-        max_length=256,
-        return_tensors="np"
-    )
+    # No padding here: batches are padded to their own longest review at training time
+    token_ids = tokenizer(df["cleaned_text"].tolist(), truncation=True, max_length=MAX_LENGTH)["input_ids"]
     
     indices = np.arange(len(df))
     np.random.shuffle(indices)
     split_idx = int(len(df) * (1 - test_size))
     
     return {
-        "train": {k: v[indices[:split_idx]] for k, v in encodings.items()},
-        "test": {k: v[indices[split_idx:]] for k, v in encodings.items()}
+        "train": pack_token_ids([token_ids[i] for i in indices[:split_idx]]),
+        "test": pack_token_ids([token_ids[i] for i in indices[split_idx:]])
     }, df["label"].values[indices[:split_idx]], df["label"].values[indices[split_idx:]]
 
+def iter_encoded_batches(file_path, batch_size=1000, max_length=MAX_LENGTH, n_process=CLEAN_PROCESSES,
+                         return_text=False):
+    """
+    Stream a full pass over a dataset, cleaning and tokenizing it one batch at a time.
+    
+    :param file_path: Path to the file containing the review data.
+    :param batch_size: Number of reviews per batch.
+    :param max_length: Maximum sequence length; longer reviews are truncated.
+    :param n_process: Number of spaCy worker processes used for cleaning.
+    :param return_text: Also yield the cleaned texts of the batch.
+    :return: A generator of (input_ids, labels) tuples, where input_ids holds one unpadded
+             list of token ids per review and labels is a numpy array, or of
+             (input_ids, labels, cleaned_texts) tuples when return_text is set.
+    """
+    rows = (
+        (text, label)
+        for chunk in iter_data(file_path, chunk_size=batch_size)
+        for text, label in zip(chunk["review_text"].tolist(), chunk["label"].tolist())
+    )
+    # One pipe over the whole stream keeps the worker processes alive between batches
+    cleaned = clean_texts(rows, n_process=n_process, as_tuples=True)
+    while True:
+        batch = list(islice(cleaned, batch_size))
+        if not batch:
+            break
+        texts = [text for text, _ in batch]
+        encodings = tokenizer(texts, truncation=True, max_length=max_length)
+        labels = np.array([label for _, label in batch])
+        yield (encodings["input_ids"], labels, texts) if return_text else (encodings["input_ids"], labels)
+
 if __name__ == "__main__":
     df = load_data("data/Fake_Reviews_Detection_Dataset.csv")
     print("Sample labels:")
-    print(df["label"].value_counts())
\ No newline at end of file
+    print(df["label"].value_counts())
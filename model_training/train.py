@@ -1,31 +1,99 @@
+import json
+import os
+import time
 import torch
-from transformers import RobertaForSequenceClassification, RobertaTokenizer, Trainer, TrainingArguments  # Added RobertaTokenizer
+from transformers import (
+    RobertaForSequenceClassification, RobertaTokenizerFast, Trainer, TrainerCallback, TrainingArguments
+)
+from transformers.trainer_pt_utils import LengthGroupedSampler
 import numpy as np
 from sklearn.metrics import accuracy_score, f1_score
 import pandas as pd
-from preprocessing import preprocess_data, load_data
+from artifacts import ArtifactStore, artifact_key, encode_strings
+from preprocessing import iter_encoded_batches, pack_token_ids, preprocess_data, load_data, preprocessing_config
 
 # Initialize tokenizer globally
-tokenizer = RobertaTokenizer.from_pretrained("roberta-base")  # <-- Added this line
+tokenizer = RobertaTokenizerFast.from_pretrained("roberta-base")
+
+DATA_PATH = "data/Fake_Reviews_Detection_Dataset.csv"
+
+# Cleaned and tokenized datasets are stored here and reused while the data file, the preprocessing
+# settings and the tokenizer are unchanged (an empty value always preprocesses from scratch)
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR", "data/artifacts")
+
+# Number of reviews sampled from the data file for training and evaluation. 0 trains on every
+# review: the file is then cleaned and tokenized batch by batch straight into the artifact store,
+# so peak memory stays bounded by one batch whatever the size of the corpus.
+TRAIN_SAMPLE_SIZE = int(os.getenv("TRAIN_SAMPLE_SIZE", "2000")) or None
+
+# Training profile: "default" keeps the original fp32 settings, "cpu" tunes precision, batching,
+# data loading and threads for CPU-only machines, and "auto" picks "cpu" when no GPU is available
+TRAINING_PROFILE = os.getenv("TRAINING_PROFILE", "default")
+
+# The learning rate warms up over the first WARMUP_SAMPLES training reviews (500 steps of the
+# default profile's 16 reviews), whatever the effective batch size of the profile
+WARMUP_SAMPLES = 500 * 16
+
+# Settings of the "cpu" profile. The effective batch size is TRAIN_BATCH_SIZE * TRAIN_GRAD_ACCUMULATION.
+# Thread counts of 0 are derived from the available cores and the number of dataloader workers.
+TRAIN_BATCH_SIZE = int(os.getenv("TRAIN_BATCH_SIZE", "16"))
+TRAIN_GRAD_ACCUMULATION = int(os.getenv("TRAIN_GRAD_ACCUMULATION", "2"))
+TRAIN_DATALOADER_WORKERS = int(os.getenv("TRAIN_DATALOADER_WORKERS", "2"))
+TRAIN_INTRA_OP_THREADS = int(os.getenv("TRAIN_INTRA_OP_THREADS", "0"))
+TRAIN_INTER_OP_THREADS = int(os.getenv("TRAIN_INTER_OP_THREADS", "0"))
+
+# Distributed data-parallel training: torchrun sets WORLD_SIZE and LOCAL_WORLD_SIZE for every
+# process it launches (see model_training/launch_ddp.py)
+WORLD_SIZE = int(os.getenv("WORLD_SIZE", "1"))
+LOCAL_WORLD_SIZE = int(os.getenv("LOCAL_WORLD_SIZE", "1"))
+
+# Seed for sampling and splitting the dataset. Every process of a distributed run must see the same
+# split, so distributed runs fall back to seed 0 when it is not set.
+TRAIN_SEED = int(os.environ["TRAIN_SEED"]) if os.getenv("TRAIN_SEED") else (0 if WORLD_SIZE > 1 else None)
+
+# Output location, an optional cap on the number of optimizer steps (-1 trains for the full
+# epochs) and an optional JSON file receiving the throughput of the run, used for benchmarking
+TRAIN_OUTPUT_DIR = os.getenv("TRAIN_OUTPUT_DIR", "model")
+TRAIN_MAX_STEPS = int(os.getenv("TRAIN_MAX_STEPS", "-1"))
+TRAIN_METRICS_FILE = os.getenv("TRAIN_METRICS_FILE", "")
+
+# Evaluate and checkpoint at the end of every epoch ("epoch"), or never ("no"), which keeps eval
+# passes and checkpoint writes out of timed benchmark runs
+TRAIN_EVAL_STRATEGY = os.getenv("TRAIN_EVAL_STRATEGY", "epoch")
 
 class ReviewDataset(torch.utils.data.Dataset):
     """
     A custom PyTorch Dataset for handling tokenized review data and associated labels.
+    
+    Reviews are stored unpadded and back to back in one token array (see preprocessing.pack_token_ids),
+    and each sample is a view into it, so no per-sample tensors are allocated.
     """
     def __init__(self, encodings, labels):
-        self.encodings = encodings
+        """
+        :param encodings: Dict with the packed 'input_ids' array and its 'offsets'.
+        :param labels: Array of labels, one per review.
+        """
+        self.input_ids = encodings["input_ids"]
+        self.offsets = encodings["offsets"]
         self.labels = labels
+        # Token count of every review, read from the offsets without touching the token array
+        self.lengths = np.diff(self.offsets)
 
     def __getitem__(self, idx):
         """
         Retrieve a single sample of tokenized data and the corresponding label by index.
         
+        The token tensor is a view of the underlying array rather than a copy, so samples read
+        from memory-mapped artifacts are loaded straight from the page cache.
+        
         :param idx: Index into the dataset.
-        :return: A dictionary of tokenized inputs and label tensor.
+        :return: A dictionary of unpadded input ids and label tensor.
         """
-        item = {key: torch.tensor(val[idx]) for key, val in self.encodings.items()}
-        item["labels"] = torch.tensor(self.labels[idx])
-        return item
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return {
+            "input_ids": torch.from_numpy(self.input_ids[start:end]),
+            "labels": torch.as_tensor(self.labels[idx])
+        }
 
     def __len__(self):
         """
@@ -35,10 +103,66 @@ class ReviewDataset(torch.utils.data.Dataset):
         """
         return len(self.labels)
 
+class PaddingCollator:
+    """
+    Pads each batch to its own longest review, rounded up to a multiple of pad_to_multiple_of,
+    instead of padding the whole dataset to its longest review.
+    """
+    def __init__(self, pad_token_id, pad_to_multiple_of=8):
+        """
+        :param pad_token_id: Token id used for padding.
+        :param pad_to_multiple_of: Padded lengths are rounded up to a multiple of this.
+        """
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features):
+        """
+        Collate samples from ReviewDataset into padded batch tensors.
+        
+        :param features: List of samples.
+        :return: A dict of 'input_ids', 'attention_mask' and 'labels' tensors, plus any other
+                 fixed-size field of the samples.
+        """
+        longest = max(len(feature["input_ids"]) for feature in features)
+        length = -(-longest // self.pad_to_multiple_of) * self.pad_to_multiple_of
+        input_ids = torch.full((len(features), length), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), length), dtype=torch.long)
+        for row, feature in enumerate(features):
+            ids = feature["input_ids"]
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+        batch = {"input_ids": input_ids, "attention_mask": attention_mask}
+        # Fixed-size fields (labels, and teacher logits when distilling) are stacked as they are
+        for key in features[0]:
+            if key != "input_ids":
+                batch[key] = torch.stack([feature[key] for feature in features])
+        return batch
+
+class ReviewTrainer(Trainer):
+    """
+    Trainer that groups reviews of similar length using ReviewDataset.lengths. Without lengths,
+    LengthGroupedSampler would load every sample once to measure it, paging the whole
+    memory-mapped token array in each time the training dataloader is built.
+    """
+    def _get_train_sampler(self, *args, **kwargs):
+        dataset = self.train_dataset
+        lengths = getattr(dataset, "lengths", None)
+        if not self.args.group_by_length or lengths is None:
+            return super()._get_train_sampler(*args, **kwargs)
+        return LengthGroupedSampler(
+            self.args.train_batch_size * self.args.gradient_accumulation_steps,
+            dataset=dataset,
+            lengths=lengths
+        )
+
 def compute_metrics(pred):
     """
     Compute accuracy and F1 score from the model predictions.
     
+    In a distributed run, Trainer gathers the predictions of every process (dropping the samples
+    repeated to even out the shards) before calling this, so the metrics cover the whole test set.
+    
     :param pred: An object containing 'predictions' and 'label_ids'.
     :return: A dictionary with 'accuracy' and 'f1'.
     """
@@ -49,15 +173,233 @@ def compute_metrics(pred):
         "f1": f1_score(labels, preds, average="weighted")
     }
 
-def train_model():
+def store_full_pass(store, key, data_path, metadata, seed=None, test_size=0.2, batch_size=1000):
+    """
+    Clean and tokenize every review of a data file and store the result as an artifact, appending
+    one batch at a time so that peak memory is bounded by a batch rather than by the corpus.
+    
+    Each review is assigned to the test split with probability test_size, so the split sizes are
+    only approximately proportional.
+    
+    :param store: The ArtifactStore receiving the dataset.
+    :param key: Artifact key of the dataset.
+    :param data_path: Path to the raw dataset file.
+    :param metadata: Preprocessing settings recorded in the manifest.
+    :param seed: Random seed for the split.
+    :param test_size: Fraction of data to use for testing.
+    :param batch_size: Number of reviews cleaned and tokenized at a time.
+    :return: Directory of the artifact.
+    """
+    rng = np.random.default_rng(seed)
+    token_ends = {"train": 0, "test": 0}
+    text_end = 0
+    with store.writer(key) as writer:
+        for split in token_ends:
+            writer.append(f"{split}_input_ids", np.empty(0, dtype=np.int32))
+            writer.append(f"{split}_offsets", np.zeros(1, dtype=np.int64))
+            writer.append(f"{split}_labels", np.empty(0, dtype=np.int64))
+        writer.append("cleaned_text", np.empty(0, dtype=np.uint8))
+        writer.append("cleaned_text_offsets", np.zeros(1, dtype=np.int64))
+        
+        for token_ids, labels, texts in iter_encoded_batches(data_path, batch_size=batch_size, return_text=True):
+            is_test = rng.random(len(labels)) < test_size
+            for split, rows in (("train", np.flatnonzero(~is_test)), ("test", np.flatnonzero(is_test))):
+                packed = pack_token_ids([token_ids[i] for i in rows])
+                writer.append(f"{split}_input_ids", packed["input_ids"])
+                writer.append(f"{split}_offsets", packed["offsets"][1:] + token_ends[split])
+                writer.append(f"{split}_labels", labels[rows].astype(np.int64))
+                token_ends[split] += int(packed["offsets"][-1])
+            cleaned_text, cleaned_text_offsets = encode_strings(texts)
+            writer.append("cleaned_text", cleaned_text)
+            writer.append("cleaned_text_offsets", cleaned_text_offsets[1:] + text_end)
+            text_end += int(cleaned_text_offsets[-1])
+        return writer.commit(metadata=metadata)
+
+def load_encoded_dataset(data_path=DATA_PATH, sample_size=TRAIN_SAMPLE_SIZE, seed=None, test_size=0.2):
+    """
+    Load the cleaned, tokenized and split dataset from the artifact store, preprocessing and
+    storing it first if no artifact matches the data file, the settings and the tokenizer.
+    
+    :param data_path: Path to the raw dataset file.
+    :param sample_size: Number of reviews sampled from the file (None keeps every review, streamed
+                        through store_full_pass()).
+    :param seed: Random seed for sampling and splitting.
+    :param test_size: Fraction of data to use for testing.
+    :return: A tuple of (encodings, train labels, test labels) as returned by preprocess_data.
+    """
+    if seed is not None:
+        np.random.seed(seed)  # preprocess_data shuffles with the global numpy generator
+    if not ARTIFACTS_DIR:
+        if sample_size is None:
+            raise ValueError("Training on every review streams the dataset into the artifact store; set ARTIFACTS_DIR")
+        return preprocess_data(load_data(data_path, sample_size=sample_size, seed=seed), test_size=test_size)
+    
+    store = ArtifactStore(ARTIFACTS_DIR)
+    config = dict(preprocessing_config(), sample_size=sample_size, seed=seed, test_size=test_size)
+    key = artifact_key(data_path, config, tokenizer)
+    arrays = store.load(key)
+    if arrays is None and sample_size is None:
+        print(f"No preprocessed dataset for {data_path} with these settings, preprocessing every review")
+        print(f"Saved preprocessed dataset to {store_full_pass(store, key, data_path, config, seed, test_size)}")
+        arrays = store.load(key)
+    elif arrays is None:
+        print(f"No preprocessed dataset for {data_path} with these settings, preprocessing it")
+        df = load_data(data_path, sample_size=sample_size, seed=seed)
+        encodings, train_labels, test_labels = preprocess_data(df, test_size=test_size)
+        cleaned_text, cleaned_text_offsets = encode_strings(df["cleaned_text"].tolist())
+        arrays = {f"{split}_{name}": values for split in ("train", "test") for name, values in encodings[split].items()}
+        arrays.update(
+            train_labels=train_labels,
+            test_labels=test_labels,
+            cleaned_text=cleaned_text,
+            cleaned_text_offsets=cleaned_text_offsets
+        )
+        print(f"Saved preprocessed dataset to {store.save(key, arrays, metadata=config)}")
+        arrays = store.load(key)
+    else:
+        print(f"Loaded preprocessed dataset from {store.path(key)}")
+    
+    encodings = {
+        split: {name[len(split) + 1:]: values for name, values in arrays.items()
+                if name.startswith(f"{split}_") and name != f"{split}_labels"}
+        for split in ("train", "test")
+    }
+    return encodings, arrays["train_labels"], arrays["test_labels"]
+
+class ThroughputCallback(TrainerCallback):
+    """
+    Prints the wall time and training samples per second (summed over all processes) of every epoch
+    and of the whole run, so that training profiles can be compared.
+    """
+    def __init__(self, metrics_file=""):
+        """
+        :param metrics_file: Optional path of a JSON file receiving the throughput of the whole run.
+        """
+        self.metrics_file = metrics_file
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self.train_start = time.perf_counter()
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self.epoch_start = time.perf_counter()
+        self.epoch_start_step = state.global_step
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        if not state.is_world_process_zero:
+            return
+        elapsed = time.perf_counter() - self.epoch_start
+        samples = (state.global_step - self.epoch_start_step) * self._samples_per_step(args)
+        print(f"Epoch {state.epoch:.0f}: {elapsed:.1f}s, {samples / elapsed:.1f} samples/s")
+
+    def on_train_end(self, args, state, control, **kwargs):
+        if not state.is_world_process_zero:
+            return
+        elapsed = time.perf_counter() - self.train_start
+        samples = state.global_step * self._samples_per_step(args)
+        print(f"Training: {elapsed:.1f}s, {samples / elapsed:.1f} samples/s over {args.world_size} processes")
+        if self.metrics_file:
+            with open(self.metrics_file, "w") as f:
+                json.dump({
+                    "world_size": args.world_size,
+                    "steps": state.global_step,
+                    "seconds": elapsed,
+                    "samples_per_second": samples / elapsed
+                }, f)
+
+    @staticmethod
+    def _samples_per_step(args):
+        return args.per_device_train_batch_size * args.gradient_accumulation_steps * args.world_size
+
+def cpu_supports_bf16():
+    """
+    Check whether the CPU has native bf16 instructions (AVX512-BF16 or AMX). Without them bf16
+    autocast is emulated and slower than fp32.
+    
+    :return: True if bf16 autocast is worth enabling.
+    """
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = next((line.split(":", 1)[1].split() for line in f if line.startswith("flags")), [])
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+def training_profile_args(profile):
+    """
+    Return the TrainingArguments of a training profile, configuring torch threads as a side effect.
+    
+    :param profile: "default", "cpu" or "auto".
+    :return: A dict of keyword arguments for TrainingArguments.
+    """
+    if profile == "auto":
+        profile = "default" if torch.cuda.is_available() else "cpu"
+    if profile == "default":
+        return {"per_device_train_batch_size": 16, "per_device_eval_batch_size": 16, "warmup_steps": 500}
+    if profile != "cpu":
+        raise ValueError(f"Unknown TRAINING_PROFILE '{profile}'. Choose one of: default, cpu, auto")
+    
+    # Split the cores between the processes on this machine and leave one core per dataloader
+    # worker; the workers themselves run single-threaded
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    intra_op = TRAIN_INTRA_OP_THREADS or max(1, cores // LOCAL_WORLD_SIZE - TRAIN_DATALOADER_WORKERS)
+    inter_op = TRAIN_INTER_OP_THREADS or 1
+    torch.set_num_threads(intra_op)
+    try:
+        torch.set_num_interop_threads(inter_op)
+    except RuntimeError:
+        # Can only be set once, before any inter-op parallel work has started
+        print("Warning: inter-op thread count already fixed, ignoring TRAIN_INTER_OP_THREADS")
+    
+    bf16 = cpu_supports_bf16()
+    print(f"CPU training profile: bf16={bf16}, batch={TRAIN_BATCH_SIZE}x{TRAIN_GRAD_ACCUMULATION}, "
+          f"dataloader workers={TRAIN_DATALOADER_WORKERS}, threads={intra_op}/{inter_op}")
+    profile_args = {
+        "use_cpu": True,
+        "bf16": bf16,
+        "per_device_train_batch_size": TRAIN_BATCH_SIZE,
+        "per_device_eval_batch_size": TRAIN_BATCH_SIZE * 2,
+        "gradient_accumulation_steps": TRAIN_GRAD_ACCUMULATION,
+        "dataloader_num_workers": TRAIN_DATALOADER_WORKERS,
+        "dataloader_persistent_workers": TRAIN_DATALOADER_WORKERS > 0,
+        "dataloader_pin_memory": False,
+        "warmup_steps": max(1, WARMUP_SAMPLES // (TRAIN_BATCH_SIZE * TRAIN_GRAD_ACCUMULATION * WORLD_SIZE))
+    }
+    if WORLD_SIZE > 1:
+        profile_args["ddp_backend"] = "gloo"
+        profile_args["ddp_find_unused_parameters"] = False
+    return profile_args
+
+def train_model(profile=TRAINING_PROFILE):
     """
     Train a Roberta model on the preprocessed dataset, then save the trained model and tokenizer.
     
+    :param profile: Training profile, see TRAINING_PROFILE.
     :return: None
     """
-    # Load preprocessed data
-    df = load_data("data/Fake_Reviews_Detection_Dataset.csv")
-    encodings, train_labels, test_labels = preprocess_data(df)
+    # Configure threads before any parallel work starts
+    profile_args = training_profile_args(profile)
+    
+    # Training arguments
+    training_args = TrainingArguments(
+        output_dir=TRAIN_OUTPUT_DIR,
+        num_train_epochs=4,
+        max_steps=TRAIN_MAX_STEPS,
+        weight_decay=0.01,
+        logging_dir="logs/",
+        evaluation_strategy=TRAIN_EVAL_STRATEGY,
+        save_strategy=TRAIN_EVAL_STRATEGY,
+        load_best_model_at_end=TRAIN_EVAL_STRATEGY != "no",
+        logging_steps=10,
+        # Batch reviews of similar length together so that per-batch padding stays small
+        group_by_length=True,
+        **profile_args
+    )
+    
+    # Load preprocessed data, reusing the stored artifact of a previous run when possible. In a
+    # distributed run the main process preprocesses first and the others then load its artifact;
+    # Trainer shards the training set across the processes.
+    with training_args.main_process_first(desc="dataset preprocessing"):
+        encodings, train_labels, test_labels = load_encoded_dataset(seed=TRAIN_SEED)
     
     # Create datasets
     train_dataset = ReviewDataset(encodings["train"], train_labels)
@@ -71,36 +413,25 @@ def train_model():
         attention_probs_dropout_prob=0.1
     )
     
-    # Training arguments
-    training_args = TrainingArguments(
-        output_dir="model/",
-        num_train_epochs=4,
-        per_device_train_batch_size=16,
-        per_device_eval_batch_size=16,
-        warmup_steps=500,
-        weight_decay=0.01,
-        logging_dir="logs/",
-        evaluation_strategy="epoch",
-        save_strategy="epoch",
-        load_best_model_at_end=True,
-        logging_steps=10
-    )
-    
     # Initialize Trainer
-    trainer = Trainer(
+    trainer = ReviewTrainer(
         model=model,
         args=training_args,
         train_dataset=train_dataset,
         eval_dataset=test_dataset,
-        compute_metrics=compute_metrics
+        data_collator=PaddingCollator(tokenizer.pad_token_id),
+        compute_metrics=compute_metrics,
+        callbacks=[ThroughputCallback(TRAIN_METRICS_FILE)]
     )
     
     # Train and save
     print("Starting training...")
     trainer.train()
-    trainer.save_model("model/final_model")
-    tokenizer.save_pretrained("model/final_model")  # Now uses the global tokenizer
-    print("Training complete! Model saved.")
+    final_model_dir = os.path.join(TRAIN_OUTPUT_DIR, "final_model")
+    trainer.save_model(final_model_dir)
+    if trainer.is_world_process_zero():
+        tokenizer.save_pretrained(final_model_dir)  # Now uses the global tokenizer
+        print("Training complete! Model saved.")
 
 if __name__ == "__main__":
     train_model()
\ No newline at end of file